@@ -1,12 +1,90 @@
 # algorithms.py
+import re
+from collections import Counter, OrderedDict, defaultdict
+from functools import lru_cache
+from operator import itemgetter
+
+# pandas/numpy are heavy and only a few code paths need them, so they are
+# imported on first use and kept here instead of re-importing per call
+_pd = None
+_np = None
+_duckdb = None
+
+# Above this many rows group_and_aggregate hands off to pandas' C-level groupby
+GROUPBY_VECTORIZE_THRESHOLD = 10_000
+
+# At this many rows it goes to DuckDB instead, if installed (it's optional)
+GROUPBY_DUCKDB_THRESHOLD = 1_000_000
+
+# How many keyword_search result lists a Searching instance keeps around
+SEARCH_CACHE_SIZE = 128
+
+def _pandas():
+    global _pd
+    if _pd is None:
+        import pandas as _pd
+    return _pd
+
+def _numpy():
+    global _np
+    if _np is None:
+        import numpy as _np
+    return _np
+
+def _load_duckdb():
+    """Returns the duckdb module, or None if it isn't installed."""
+    global _duckdb
+    if _duckdb is None:
+        try:
+            import duckdb as _duckdb
+        except ImportError:
+            _duckdb = False
+    return _duckdb or None
+
+# What group_and_aggregate sums and averages; bool counts, as it's an int
+_NUMERIC_TYPES = (int, float)
+
+def _to_columnar(data: list, fields) -> dict:
+    """
+    Pivots a list of row dicts into one list per field (missing keys become
+    None). pandas builds frames and series from columns far faster than from
+    row dicts, and only the requested fields are touched.
+    """
+    return {field: [item.get(field) for item in data] for field in fields}
+
+def _aggregate_column(data: list, field: str):
+    """
+    One aggregated field as numpy arrays, under the same rules as the
+    streaming accumulators: (values, numeric, present), where 'numeric'
+    marks the int/float values that sum/avg take (others read as 0.0) and
+    'present' the rows that have the field at all, even as None.
+    """
+    np = _numpy()
+    column = [item.get(field) for item in data]
+    numeric = np.fromiter((isinstance(v, _NUMERIC_TYPES) for v in column), dtype=bool, count=len(column))
+    values = np.fromiter((v if ok else 0.0 for v, ok in zip(column, numeric)),
+                         dtype=np.float64, count=len(column))
+    present = np.fromiter((field in item for item in data), dtype=bool, count=len(data))
+    return values, numeric, present
+
+@lru_cache(maxsize=128)
+def _parse_query(query: str):
+    """
+    Splits a query into lowercased terms and compiles one alternation regex
+    matching any of them. Cached so repeated searches skip both steps.
+    """
+    query_terms = tuple(query.lower().split())
+    return query_terms, re.compile('|'.join(map(re.escape, query_terms)))
 
 class Sorting:
     """A collection of sorting algorithms."""
 
     def quicksort(self, data: list, sort_by: str, ascending: bool = True):
         """
-        Sorts a list of dictionaries using the Quicksort algorithm.
-        Time complexity: O(n log n) on average, O(n^2) in the worst case.
+        Sorts a list of dictionaries by a key.
+        Delegates to Python's built-in Timsort (list.sort), which runs in C,
+        is stable, and is O(n log n) in the worst case and O(n) on data that
+        is already (partially) ordered.
         
         Args:
             data (list): A list of dictionaries to sort.
@@ -21,52 +99,40 @@ class Sorting:
         
         # Make a copy to not modify the original list
         arr = list(data)
-        
-        # The stack for the iterative version of quicksort
-        stack = [(0, len(arr) - 1)]
-
-        while stack:
-            low, high = stack.pop()
-            
-            if low >= high:
-                continue
-
-            # Partitioning
-            pivot = arr[(low + high) // 2][sort_by]
-            i, j = low, high
-            
-            while i <= j:
-                while (arr[i][sort_by] < pivot) if ascending else (arr[i][sort_by] > pivot):
-                    i += 1
-                while (arr[j][sort_by] > pivot) if ascending else (arr[j][sort_by] < pivot):
-                    j -= 1
-                
-                if i <= j:
-                    arr[i], arr[j] = arr[j], arr[i]
-                    i += 1
-                    j -= 1
-            
-            # Push subarrays onto the stack
-            if low < j:
-                stack.append((low, j))
-            if i < high:
-                stack.append((i, high))
-                
+        arr.sort(key=itemgetter(sort_by), reverse=not ascending)
         return arr
 
 class Searching:
     """A collection of searching algorithms."""
 
-    def keyword_search(self, data: list, query: str, search_fields: list):
+    def __init__(self):
+        # Results of recent searches, most recently used last, all for the
+        # data version in _cache_version. Only the results are kept, never
+        # the searched list, and a new version drops the older entries.
+        self._results_cache = OrderedDict()
+        self._cache_version = None
+
+    def invalidate(self):
+        """Drops cached search results, e.g. after the searched data changed."""
+        self._cache_version = None
+        self._results_cache.clear()
+
+    def keyword_search(self, data: list, query: str, search_fields: list, version=None):
         """
         Performs a keyword search across specified fields in a list of dictionaries.
         This is a linear search, O(n*m*k) where n is # of items, m is # of fields, 
-        and k is # of query terms.
+        and k is # of query terms. The searched fields of an item are scanned
+        once with a combined pattern of all terms, so items without any hit
+        skip the per-term counting entirely. When the caller passes a data
+        version, repeating a search (e.g. while paging) is served from a small
+        LRU cache until the version changes.
         
         Args:
             data (list): The list of dictionaries to search.
             query (str): The search query string.
             search_fields (list): A list of keys to search within each dictionary.
+            version: Optional hashable that changes whenever the searched data
+                does, e.g. a database write counter. None disables caching.
             
         Returns:
             list: A list of matching dictionaries with a 'relevance_score'.
@@ -74,25 +140,41 @@ class Searching:
         if not query:
             return data
             
-        query_terms = query.lower().split()
+        query_terms, any_term = _parse_query(query)
+        cache_key = (query_terms, tuple(search_fields))
+        if version is not None:
+            if version != self._cache_version:
+                self._results_cache.clear()
+                self._cache_version = version
+            cached = self._results_cache.get(cache_key)
+            if cached is not None:
+                self._results_cache.move_to_end(cache_key)
+                return list(cached)
+
         results = []
         
-        for item in data:
-            score = 0
-            for field in search_fields:
-                if field in item and item[field]:
-                    field_text = str(item[field]).lower()
-                    for term in query_terms:
-                        if term in field_text:
-                            score += field_text.count(term)
+        for i, item in enumerate(data):
+            # Lowercase all searched fields in one go. Terms never contain
+            # whitespace, so the '\n' separator stops matches spanning fields.
+            item_text = '\n'.join([str(item[field]) for field in search_fields if item.get(field)]).lower()
+            if not any_term.search(item_text):
+                continue
+            # count() is 0 on a miss, so no separate `in` scan
+            score = sum([item_text.count(term) for term in query_terms])
             
             if score > 0:
-                item_copy = item.copy()
-                item_copy['relevance_score'] = score
-                results.append(item_copy)
+                # Negated score sorts best-first; the index keeps ties in input order
+                results.append((-score, i, item))
                 
-        # Sort results by relevance score
-        return sorted(results, key=lambda x: x['relevance_score'], reverse=True)
+        # Sort results by relevance score, copying only the matched items
+        results.sort()
+        results = [{**item, 'relevance_score': -neg_score} for neg_score, _, item in results]
+
+        if version is not None:
+            self._results_cache[cache_key] = results
+            if len(self._results_cache) > SEARCH_CACHE_SIZE:
+                self._results_cache.popitem(last=False)
+        return list(results)
 
 class Aggregation:
     """A collection of aggregation functions."""
@@ -101,8 +183,16 @@ class Aggregation:
         """Calculates the median of a list of numbers."""
         if not numbers:
             return 0
+        n = len(numbers)
+        if n >= 64:
+            # Quickselect the middle element(s) instead of sorting everything
+            np = _numpy()
+            mid = n // 2
+            if n % 2 == 0:
+                part = np.partition(np.asarray(numbers), [mid - 1, mid])
+                return (part[mid - 1].item() + part[mid].item()) / 2
+            return np.partition(np.asarray(numbers), mid)[mid].item()
         sorted_nums = sorted(numbers)
-        n = len(sorted_nums)
         mid = n // 2
         if n % 2 == 0:
             return (sorted_nums[mid - 1] + sorted_nums[mid]) / 2
@@ -113,14 +203,15 @@ class Aggregation:
         """Calculates the mode of a list."""
         if not data:
             return None
-        return max(set(data), key=data.count)
+        return Counter(data).most_common(1)[0][0]
 
     def time_series_aggregation(self, data: list, date_field: str, value_field: str, period: str = 'M'):
         """
         Aggregates data into a time-series.
         
         Args:
-            data (list): List of dictionaries with date and value fields.
+            data (list): List of dictionaries with date and value fields, or a
+                         DataFrame / dict of columns holding them.
             date_field (str): The name of the date field.
             value_field (str): The name of the numeric field to aggregate.
             period (str): 'M' for monthly, 'W' for weekly, 'D' for daily.
@@ -128,25 +219,36 @@ class Aggregation:
         Returns:
             dict: A dictionary of period -> aggregated value.
         """
-        if not data:
+        if len(data) == 0:
             return {}
         
         # Using pandas here because it's the right tool for time-series
-        import pandas as pd
+        pd = _pandas()
         
-        df = pd.DataFrame(data)
-        if date_field not in df.columns or value_field not in df.columns:
+        if isinstance(data, list):
+            if not any(date_field in item for item in data) or not any(value_field in item for item in data):
+                return {}
+            # Pull out just the two columns we need instead of building a full DataFrame
+            columns = _to_columnar(data, (date_field, value_field))
+        elif date_field in data and value_field in data:
+            # Already columnar (a DataFrame or a dict of columns)
+            columns = {field: list(data[field]) for field in (date_field, value_field)}
+        else:
+            return {}
+        dates = pd.to_datetime(columns[date_field], errors='coerce')
+        values = pd.Series(columns[value_field], index=dates)
+        values = values[values.index.notna()]
+        if values.empty:
             return {}
-            
-        df[date_field] = pd.to_datetime(df[date_field], errors='coerce')
-        df = df.dropna(subset=[date_field])
         
-        df = df.set_index(date_field)
-        aggregated = df[value_field].resample(period).sum()
+        # Bucket straight onto a PeriodIndex, then fill empty periods with 0 like resample did
+        aggregated = values.groupby(values.index.to_period(period)).sum()
+        all_periods = pd.period_range(aggregated.index.min(), aggregated.index.max(), freq=aggregated.index.freq)
+        aggregated = aggregated.reindex(all_periods, fill_value=0)
         
-        return {str(k.to_period()): v for k, v in aggregated.to_dict().items()}
+        return dict(zip(aggregated.index.astype(str), aggregated.tolist()))
 
-    def group_and_aggregate(self, data: list, group_by_key: str, aggregations: dict):
+    def group_and_aggregate(self, data: list, group_by_key: str, aggregations: dict, assume_sorted: bool = False):
         """
         Groups a list of dictionaries and performs specified aggregations.
 
@@ -155,41 +257,173 @@ class Aggregation:
             group_by_key (str): The key to group the data by.
             aggregations (dict): Defines aggregations. 
                                  Example: {'amount': ['sum', 'avg'], 'id': ['count']}
+            assume_sorted (bool): Set when data is already ordered by group_by_key
+                                  (e.g. the output of Sorting.quicksort). Each group
+                                  is then a contiguous run and is reduced without
+                                  hashing; if a group shows up twice the normal
+                                  path is used instead.
         
         Returns:
             dict: A dictionary where keys are groups and values are aggregated results.
         """
-        grouped_data = {}
+        if assume_sorted:
+            results = self._group_and_aggregate_sorted(data, group_by_key, aggregations)
+            if results is not None:
+                return results
+
+        if len(data) >= GROUPBY_DUCKDB_THRESHOLD and _load_duckdb() is not None:
+            return self._group_and_aggregate_duckdb(data, group_by_key, aggregations)
+
+        if len(data) > GROUPBY_VECTORIZE_THRESHOLD:
+            return self._group_and_aggregate_vectorized(data, group_by_key, aggregations)
+
+        # Running accumulators per group, so memory is O(groups) rather than O(rows)
+        grouped_data = defaultdict(lambda: self._new_accumulators(aggregations))
+
+        # Single pass: fold each value into its group's accumulators
+        for item in data:
+            key = item.get(group_by_key)
+            if key is None:
+                continue
+            self._accumulate(grouped_data[key], item, aggregations)
+        
+        return {key: self._finish_accumulators(accumulators, aggregations)
+                for key, accumulators in grouped_data.items()}
+
+    def _group_and_aggregate_sorted(self, data: list, group_by_key: str, aggregations: dict):
+        """
+        Run-length group_and_aggregate for data ordered by group_by_key. Only
+        the current group's accumulators are live. Returns None if the keys
+        turn out not to be contiguous.
+        """
+        results = {}
+        current_key = None
+        accumulators = None
 
-        # First pass: collect data for each group
         for item in data:
             key = item.get(group_by_key)
             if key is None:
                 continue
 
-            if key not in grouped_data:
-                grouped_data[key] = { agg_field: [] for agg_field in aggregations }
+            if accumulators is None or key != current_key:
+                if accumulators is not None:
+                    results[current_key] = self._finish_accumulators(accumulators, aggregations)
+                if key in results:
+                    return None
+                current_key = key
+                accumulators = self._new_accumulators(aggregations)
+            self._accumulate(accumulators, item, aggregations)
+
+        if accumulators is not None:
+            results[current_key] = self._finish_accumulators(accumulators, aggregations)
+        return results
+
+    def _new_accumulators(self, aggregations: dict):
+        """Empty running totals for one group."""
+        return {agg_field: {'sum': 0, 'numeric': 0, 'count': 0} for agg_field in aggregations}
+
+    def _accumulate(self, accumulators: dict, item: dict, aggregations: dict):
+        """Folds one row into its group's running totals."""
+        for agg_field in aggregations:
+            if agg_field in item:
+                value = item[agg_field]
+                acc = accumulators[agg_field]
+                acc['count'] += 1
+                # An explicit type check, not try/except around the add, so
+                # this path takes the same values as the vectorized ones
+                if isinstance(value, _NUMERIC_TYPES):
+                    acc['sum'] += value
+                    acc['numeric'] += 1
+
+    def _finish_accumulators(self, accumulators: dict, aggregations: dict):
+        """Turns a group's running totals into the requested aggregations."""
+        result_item = {}
+        for agg_field, agg_funcs in aggregations.items():
+            acc = accumulators[agg_field]
             
-            for agg_field in aggregations:
-                if agg_field in item:
-                    grouped_data[key][agg_field].append(item[agg_field])
-        
-        # Second pass: compute aggregations
+            for func in agg_funcs:
+                agg_key = f"{agg_field}_{func}"
+                if func == 'sum':
+                    result_item[agg_key] = acc['sum']
+                elif func == 'avg':
+                    result_item[agg_key] = acc['sum'] / acc['numeric'] if acc['numeric'] else 0
+                elif func == 'count':
+                    result_item[agg_key] = acc['count']
+        return result_item
+
+    def _group_and_aggregate_vectorized(self, data: list, group_by_key: str, aggregations: dict):
+        """
+        Vectorized group_and_aggregate for large inputs: keys are factorized
+        to int codes and sum/count become np.bincount scatter-reductions.
+        Same results as the streaming path: sum/avg take only int/float
+        values, and 'count' counts the rows that have the field.
+        """
+        np = _numpy()
+        pd = _pandas()
+
+        columns = _to_columnar(data, [group_by_key])
+
+        # Hash the group keys once; every reduction below runs on the int codes
+        codes, uniques = pd.factorize(pd.Series(columns[group_by_key], dtype=object), sort=False)
+        has_key = codes >= 0
+        codes = codes[has_key]
+        n_groups = len(uniques)
+
         results = {}
-        for key, values in grouped_data.items():
-            result_item = {}
-            for agg_field, agg_funcs in aggregations.items():
-                field_values = [v for v in values[agg_field] if isinstance(v, (int, float))]
-                
-                for func in agg_funcs:
-                    agg_key = f"{agg_field}_{func}"
-                    if func == 'sum':
-                        result_item[agg_key] = sum(field_values)
-                    elif func == 'avg':
-                        result_item[agg_key] = sum(field_values) / len(field_values) if field_values else 0
-                    elif func == 'count':
-                        result_item[agg_key] = len(values[agg_field])
-
-            results[key] = result_item
-            
-        return results 
\ No newline at end of file
+        for agg_field, agg_funcs in aggregations.items():
+            values, is_numeric, present = _aggregate_column(data, agg_field)
+            values, is_numeric, present = values[has_key], is_numeric[has_key], present[has_key]
+
+            sums = np.bincount(codes[is_numeric], weights=values[is_numeric], minlength=n_groups)
+            numeric_counts = np.bincount(codes[is_numeric], minlength=n_groups)
+
+            for func in agg_funcs:
+                agg_key = f"{agg_field}_{func}"
+                if func == 'sum':
+                    results[agg_key] = sums
+                elif func == 'avg':
+                    results[agg_key] = np.divide(sums, numeric_counts, out=np.zeros_like(sums),
+                                                 where=numeric_counts > 0)
+                elif func == 'count':
+                    results[agg_key] = np.bincount(codes[present], minlength=n_groups)
+
+        # factorize(sort=False) numbers groups in first-seen order, matching uniques
+        return pd.DataFrame(results, index=uniques).to_dict('index')
+
+    def _group_and_aggregate_duckdb(self, data: list, group_by_key: str, aggregations: dict):
+        """
+        group_and_aggregate as one GROUP BY query in DuckDB's multi-threaded
+        hash aggregate, for inputs too big for the numpy path. Same semantics
+        as the vectorized version.
+        """
+        duckdb = _load_duckdb()
+        pd = _pandas()
+
+        np = _numpy()
+
+        columns = _to_columnar(data, [group_by_key])
+
+        # Group on int codes so keys of any (or mixed) type survive the trip
+        codes, uniques = pd.factorize(pd.Series(columns[group_by_key], dtype=object), sort=False)
+        frame = {'code': codes}
+        select = ['code']
+        agg_keys = []
+        for i, (agg_field, agg_funcs) in enumerate(aggregations.items()):
+            values, is_numeric, present = _aggregate_column(data, agg_field)
+            # NaN reaches DuckDB as NULL, which its sum/avg skip
+            frame[f'v{i}'] = np.where(is_numeric, values, np.nan)
+            frame[f'n{i}'] = present
+            for func in agg_funcs:
+                if func == 'sum':
+                    select.append(f'coalesce(sum(v{i}), 0)')
+                elif func == 'avg':
+                    select.append(f'coalesce(avg(v{i}), 0)')
+                elif func == 'count':
+                    select.append(f'count_if(n{i})')
+                else:
+                    continue
+                agg_keys.append(f"{agg_field}_{func}")
+
+        query = f"SELECT {', '.join(select)} FROM rows WHERE code >= 0 GROUP BY code ORDER BY code"
+        rows = duckdb.query_df(pd.DataFrame(frame), 'rows', query).fetchall()
+        return {uniques[row[0]]: dict(zip(agg_keys, row[1:])) for row in rows}
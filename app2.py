@@ -1,17 +1,20 @@
 
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime, timedelta
 import numpy as np
 from typing import Dict, List, Any
 import json
-import re
-from babel.numbers import format_currency
-from babel import Locale
 import io
-from receipt_processor import ReceiptProcessor
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from receipt_processor import ReceiptProcessor, ALLOWED_TYPES
+
+# orjson is optional - a much faster encoder for the JSON exports
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
 
 # Currency mapping
 CURRENCIES = {
@@ -37,6 +40,34 @@ LANGUAGES = {
     'ja': 'Japanese'
 }
 
+# Categories offered when correcting a receipt
+CATEGORIES = ('Food', 'Shopping', 'Gas', 'Entertainment', 'Healthcare', 'Transportation', 'Other')
+
+# Selectbox positions of each option, so edit forms don't search the key lists
+_CURRENCY_INDEX = {code: i for i, code in enumerate(CURRENCIES)}
+_LANGUAGE_INDEX = {code: i for i, code in enumerate(LANGUAGES)}
+_CATEGORY_INDEX = {category: i for i, category in enumerate(CATEGORIES)}
+
+# Receipt fields written by the CSV export, and what to write when one is missing
+CSV_EXPORT_COLUMNS = [
+    'filename', 'vendor', 'amount', 'currency', 'date', 'category', 'tax',
+    'language', 'confidence', 'upload_date', 'last_modified'
+]
+CSV_EXPORT_DEFAULTS = {
+    'filename': '', 'vendor': '', 'amount': 0, 'currency': 'USD', 'date': '',
+    'category': '', 'tax': 0, 'language': 'en', 'confidence': 0,
+    'upload_date': '', 'last_modified': ''
+}
+
+# Low-cardinality text columns kept as pandas categoricals in the cached frame
+_CATEGORICAL_COLUMNS = ('vendor', 'category', 'currency', 'language')
+
+# Extensions the uploader accepts, taken from the processor's own whitelist
+_UPLOAD_TYPES = sorted(ext.lstrip('.') for ext in ALLOWED_TYPES)
+
+# Upper bound on threads used to process one batch of uploads
+MAX_UPLOAD_WORKERS = 8
+
 # Page configuration
 st.set_page_config(
     page_title="ReceiptVision Pro",
@@ -46,8 +77,7 @@ st.set_page_config(
 )
 
 # Modern Light CSS with glassmorphism
-st.markdown("""
-<style>
+_CSS = """
     @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap');
     
     .stApp {
@@ -101,6 +131,11 @@ st.markdown("""
         background: rgba(255, 255, 255, 0.95);
     }
     
+    .metrics-grid {
+        display: grid;
+        grid-template-columns: repeat(auto-fit, minmax(150px, 1fr));
+    }
+    
     .metric-value {
         font-size: 2.5rem;
         font-weight: 700;
@@ -227,18 +262,97 @@ st.markdown("""
         border-radius: 10px;
         transition: width 0.3s ease;
     }
-</style>
-""", unsafe_allow_html=True)
+"""
 
-# Initialize session state with real backend
-if 'processor' not in st.session_state:
-    st.session_state.processor = ReceiptProcessor()
-if 'show_sidebar' not in st.session_state:
-    st.session_state.show_sidebar = False
+@st.cache_resource
+def get_processor():
+    """
+    The real backend, created once per server process and shared by every
+    session. Its Database serializes access to its one sqlite3 connection,
+    so concurrent sessions and upload workers can share it.
+    """
+    return ReceiptProcessor()
 
-def about_page():
-    st.markdown('<div class="about-section">', unsafe_allow_html=True)
-    st.markdown("""
+@st.cache_data(ttl=60, show_spinner=False)
+def _load_receipts(db_version: int):
+    """
+    All receipts, fetched once per DB version instead of once per helper on
+    every rerun. The version is _db_version(), which every session shares,
+    so any write through the processor invalidates it; the ttl picks up
+    writes made by other processes.
+    """
+    return tuple(get_processor().db.get_all_receipts())
+
+@st.cache_resource(ttl=60, show_spinner=False)
+def _load_receipts_df(db_version: int):
+    """
+    The cached receipts as a DataFrame, for column-wise aggregates. The
+    schema is normalized here: vendor, amount, currency, date, category and
+    language always exist, missing category/currency/language values get
+    their defaults and amount is numeric, so views don't re-check or
+    re-clean it. Dates are parsed once into 'date_parsed' (NaT where
+    unparseable), with the calendar day and month derived alongside as
+    'date_day' and 'date_month' for the timeline. Vendor, category,
+    currency and language are categoricals, so group-bys hash small
+    integer codes.
+
+    Cached as a resource, so every caller gets the same object without a
+    pickle round trip: treat it as read-only and filter/reindex into a new
+    frame before adding columns.
+    """
+    df = pd.DataFrame(list(_load_receipts(db_version)))
+    if df.empty:
+        return df
+    for column, default in (('category', 'Other'), ('currency', 'USD'), ('language', 'en')):
+        df[column] = df[column].fillna(default) if column in df else default
+    for column, default in (('vendor', 'Unknown'), ('date', None)):
+        if column not in df:
+            df[column] = default
+    df['amount'] = pd.to_numeric(df['amount'], errors='coerce').fillna(0.0) if 'amount' in df else 0.0
+    df['date_parsed'] = pd.to_datetime(df['date'], errors='coerce', cache=True)
+    df['date_day'] = df['date_parsed'].dt.date
+    df['date_month'] = df['date_parsed'].dt.to_period('M')
+    # Confidence is a 0-100 score, so float32 is plenty. Money columns stay
+    # float64: float32 loses cents once totals reach the hundred thousands.
+    if 'confidence' in df:
+        df['confidence'] = pd.to_numeric(df['confidence'], errors='coerce').astype('float32')
+    for column in _CATEGORICAL_COLUMNS:
+        df[column] = df[column].astype('category')
+    return df
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _receipt_labels(db_version: int):
+    """Selectbox labels for the corrections page, one per cached receipt."""
+    return [f"{i}: {r.get('vendor', 'Unknown')} - {CURRENCIES.get(r.get('currency', 'USD'), '$')}{r.get('amount', 0):.2f} ({r.get('date', 'No date')})" 
+            for i, r in enumerate(_load_receipts(db_version))]
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _search_options(db_version: int):
+    """Filter choices and bounds for the search page, computed once per DB version."""
+    df = _load_receipts_df(db_version)
+    return {
+        'amount_max': float(df['amount'].max()),
+        'categories': df['category'].unique().tolist(),
+        'currencies': df['currency'].unique().tolist(),
+        'languages': df['language'].unique().tolist(),
+        'date_min': df['date_parsed'].min().date(),
+        'date_max': df['date_parsed'].max().date()
+    }
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _storage_size(db_version: int):
+    """Size of the stored receipts as compact JSON in bytes, once per DB version."""
+    return len(_to_json_bytes(_load_receipts(db_version), indent=False))
+
+def _db_version():
+    """
+    Cache key for the receipts: the shared Database's write counter. Caches
+    are shared by all sessions, so the key must be too; a per-session
+    counter could match another session's entry from before a write.
+    """
+    return get_processor().db.write_count
+
+_ABOUT_HTML = """
     <h2 style="color: #2d3748; margin-bottom: 1rem; text-align:center;">About This Project</h2>
     <p style="font-size: 1.1rem; color: #718096; max-width: 900px; margin: 0 auto; line-height: 1.7; text-align:center;">
         <b>Receipt & Bill Processing Mini-Application</b> is a full-stack solution for uploading, parsing, and analyzing receipts and bills (e.g., electricity, internet, groceries). The system extracts structured data using rule-based logic and/or OCR, then presents summarized insights such as total spend, top vendors, and billing trends. The focus is on robust backend algorithms (search, sort, aggregation) and an interactive, modern UI.
@@ -298,11 +412,28 @@ def about_page():
     <div style="text-align:center; margin:2rem 0;">
         <span style="font-size:1.2rem; color:#2d3748; font-weight:600;">Built with Python, Streamlit, Pandas, Plotly, and SQLite</span>
     </div>
-    """, unsafe_allow_html=True)
+"""
+
+@st.fragment
+def about_page():
+    st.markdown('<div class="about-section">', unsafe_allow_html=True)
+    st.markdown(_ABOUT_HTML, unsafe_allow_html=True)
     st.markdown('</div>', unsafe_allow_html=True)
 
+def _inject_css():
+    """
+    Adds the app stylesheet to the page. Streamlit drops elements that a
+    rerun doesn't re-emit, so this runs every time main() does.
+    """
+    st.markdown(f"<style>{_CSS}</style>", unsafe_allow_html=True)
+
 def main():
-    """Main application interface"""
+    """
+    Main application interface. Each tab's page is a fragment, so widget
+    interactions rerun only that page; writes that affect every tab
+    (save, delete, clear) call st.rerun() for a full refresh.
+    """
+    _inject_css()
     st.markdown('<h1 class="hero-title">🧾 ReceiptVision Pro</h1>', unsafe_allow_html=True)
 
     tab_labels = [
@@ -338,11 +469,11 @@ def main():
 
 def display_sidebar_stats():
     """Display quick stats in sidebar"""
-    receipts = st.session_state.processor.db.get_all_receipts()
+    df = _load_receipts_df(_db_version())
     
-    if receipts:
-        total_amount = sum(r['amount'] for r in receipts)
-        total_receipts = len(receipts)
+    if not df.empty:
+        total_amount = df['amount'].sum()
+        total_receipts = len(df)
         
         st.markdown(f"""
             <div style="text-align: center; margin: 1rem 0; color: #2d3748;">
@@ -353,6 +484,7 @@ def display_sidebar_stats():
             </div>
         """, unsafe_allow_html=True)
 
+@st.fragment
 def upload_page():
     """Upload and processing page with multi-currency and language support"""
     st.markdown('<div class="glass-container">', unsafe_allow_html=True)
@@ -385,7 +517,7 @@ def upload_page():
         uploaded_files = st.file_uploader(
             "Choose receipt files",
             accept_multiple_files=True,
-            type=['jpg', 'jpeg', 'png', 'pdf', 'txt'],
+            type=_UPLOAD_TYPES,
             help="Upload images, PDFs, or text files containing receipt data"
         )
         
@@ -411,90 +543,97 @@ def upload_page():
 
 def display_processing_metrics():
     """Display processing metrics with light theme"""
-    receipts = st.session_state.processor.db.get_all_receipts()
+    df = _load_receipts_df(_db_version())
     
-    if receipts:
+    if not df.empty:
         # Currency distribution
-        currency_counts = {}
-        language_counts = {}
-        
-        for receipt in receipts:
-            curr = receipt.get('currency', 'USD')
-            lang = receipt.get('language', 'en')
-            currency_counts[curr] = currency_counts.get(curr, 0) + 1
-            language_counts[lang] = language_counts.get(lang, 0) + 1
+        currency_counts = df['currency'].value_counts(sort=False).to_dict()
+        language_counts = df['language'].value_counts(sort=False).to_dict()
         
         st.markdown("### 🌍 Multi-Currency Support")
-        for curr, count in currency_counts.items():
-            st.markdown(f'<span class="currency-badge">{CURRENCIES.get(curr, curr)}: {count}</span>', unsafe_allow_html=True)
+        st.markdown(''.join(f'<span class="currency-badge">{CURRENCIES.get(curr, curr)}: {count}</span>'
+                            for curr, count in currency_counts.items()), unsafe_allow_html=True)
         
         st.markdown("### 🌐 Language Detection")
-        for lang, count in language_counts.items():
-            st.markdown(f'<span class="language-indicator">{LANGUAGES.get(lang, lang)}: {count}</span>', unsafe_allow_html=True)
+        st.markdown(''.join(f'<span class="language-indicator">{LANGUAGES.get(lang, lang)}: {count}</span>'
+                            for lang, count in language_counts.items()), unsafe_allow_html=True)
         
         metrics = [
-            ("📊", len(receipts), "Total Processed"),
+            ("📊", len(df), "Total Processed"),
             ("⚡", "1.2s", "Avg Processing Time"),
             ("🎯", "94.2%", "Accuracy Rate"),
             ("✅", "96.8%", "Success Rate")
         ]
         
-        for icon, value, label in metrics:
-            st.markdown(f"""
+        # All cards go out in one markdown element rather than one per card
+        cards = ''.join(f"""
                 <div class="metric-card">
                     <div style="font-size: 1.5rem; margin-bottom: 0.5rem;">{icon}</div>
                     <div style="font-size: 1.5rem; font-weight: 600; color: #2d3748;">{value}</div>
                     <div style="font-size: 0.8rem; color: #718096;">{label}</div>
-                </div>
-            """, unsafe_allow_html=True)
+                </div>""" for icon, value, label in metrics)
+        st.markdown(f'<div class="metrics-grid">{cards}</div>', unsafe_allow_html=True)
     else:
         st.info("Upload receipts to see processing metrics")
 
+def _process_one(processor, uploaded_file, default_currency, expected_language):
+    """Process a single upload; runs on a worker thread, so no st.* calls here"""
+    try:
+        # Hand over the upload itself; the processor streams from it
+        result = processor.process_receipt(uploaded_file, uploaded_file.name)
+        
+        # A duplicate upload is already stored, so only new receipts are added
+        if result.get('success') and not result.get('duplicate'):
+            # Add processing options to result
+            receipt_data = result['extracted_data']
+            receipt_data['filename'] = uploaded_file.name
+            receipt_data['upload_date'] = datetime.now().isoformat()
+            receipt_data['default_currency'] = default_currency
+            receipt_data['expected_language'] = expected_language
+
+            # Ensure required fields exist
+            if 'currency' not in receipt_data:
+                receipt_data['currency'] = default_currency
+            if 'language' not in receipt_data:
+                receipt_data['language'] = expected_language
+
+            processor.db.add_receipt(receipt_data)
+        
+        return {
+            'filename': uploaded_file.name,
+            'success': result.get('success', False),
+            'data': result.get('extracted_data', {}),
+            'error': result.get('error')
+        }
+        
+    except Exception as e:
+        return {
+            'filename': uploaded_file.name,
+            'success': False,
+            'error': str(e)
+        }
+
 def process_files(uploaded_files, default_currency, expected_language):
     """Process uploaded files with currency and language detection"""
     progress_bar = st.progress(0)
     status_text = st.empty()
+    status_text.text(f"Processing {len(uploaded_files)} files...")
     
-    results = []
+    processor = get_processor()
+    results = [None] * len(uploaded_files)
     
-    for i, uploaded_file in enumerate(uploaded_files):
-        progress = (i + 1) / len(uploaded_files)
-        progress_bar.progress(progress)
-        status_text.text(f"Processing {uploaded_file.name}...")
-        
-        try:
-            file_content = uploaded_file.read()
-            result = st.session_state.processor.process_receipt(file_content, uploaded_file.name)
-            
-            if result.get('success'):
-                # Add processing options to result
-                receipt_data = result['extracted_data']
-                receipt_data['filename'] = uploaded_file.name
-                receipt_data['upload_date'] = datetime.now().isoformat()
-                receipt_data['default_currency'] = default_currency
-                receipt_data['expected_language'] = expected_language
-
-                # Ensure required fields exist
-                if 'currency' not in receipt_data:
-                    receipt_data['currency'] = default_currency
-                if 'language' not in receipt_data:
-                    receipt_data['language'] = expected_language
-
-                st.session_state.processor.db.add_receipt(receipt_data)
-            
-            results.append({
-                'filename': uploaded_file.name,
-                'success': result.get('success', False),
-                'data': result.get('extracted_data', {}),
-                'error': result.get('error')
-            })
-            
-        except Exception as e:
-            results.append({
-                'filename': uploaded_file.name,
-                'success': False,
-                'error': str(e)
-            })
+    # Files are independent and OCR/PDF parsing mostly waits on C code and
+    # disk, so a few threads overlap them; progress is reported from here
+    with ThreadPoolExecutor(max_workers=min(MAX_UPLOAD_WORKERS, len(uploaded_files))) as executor:
+        futures = {
+            executor.submit(_process_one, processor, uploaded_file, default_currency, expected_language): i
+            for i, uploaded_file in enumerate(uploaded_files)
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            i = futures[future]
+            results[i] = future.result()
+            progress_bar.progress(done / len(uploaded_files))
+            status_text.text(f"Processed {uploaded_files[i].name}")
     
     progress_bar.progress(1.0)
     status_text.text("✅ Processing complete!")
@@ -508,26 +647,26 @@ def display_enhanced_results(results):
     
     success_count = sum(1 for r in results if r['success'])
     
-    col1, col2, col3 = st.columns(3)
-    
     metrics = [
-        (col1, "📁", len(results), "Files Processed"),
-        (col2, "✅", success_count, "Successful"),
-        (col3, "📊", f"{success_count/len(results)*100:.0f}%", "Success Rate")
+        ("📁", len(results), "Files Processed"),
+        ("✅", success_count, "Successful"),
+        ("📊", f"{success_count/len(results)*100:.0f}%", "Success Rate")
     ]
     
-    for col, icon, value, label in metrics:
-        with col:
-            st.markdown(f"""
+    cards = ''.join(f"""
                 <div class="metric-card">
                     <div style="font-size: 1.8rem;">{icon}</div>
                     <div class="metric-value">{value}</div>
                     <div class="metric-label">{label}</div>
-                </div>
-            """, unsafe_allow_html=True)
+                </div>""" for icon, value, label in metrics)
+    st.markdown(f'<div class="metrics-grid">{cards}</div>', unsafe_allow_html=True)
+    
+    # Item tables for every result that has items, built before rendering
+    items_dfs = {i: pd.DataFrame(r['data']['items']) for i, r in enumerate(results)
+                 if r['success'] and r['data'].get('items')}
     
     # Detailed results with enhanced information
-    for result in results:
+    for i, result in enumerate(results):
         with st.expander(f"{'✅' if result['success'] else '❌'} {result['filename']}"):
             if result['success']:
                 data = result['data']
@@ -564,21 +703,22 @@ def display_enhanced_results(results):
                     """, unsafe_allow_html=True)
                 
                 # Items breakdown if available
-                if 'items' in data and data['items']:
+                if i in items_dfs:
                     st.markdown("**Items:**")
-                    items_df = pd.DataFrame(data['items'])
-                    st.dataframe(items_df, use_container_width=True)
+                    st.dataframe(items_dfs[i], use_container_width=True, hide_index=True)
                 
             else:
                 st.error(f"Error: {result.get('error', 'Unknown error')}")
 
+@st.fragment
 def corrections_page():
     """Manual corrections page for parsed data"""
     st.markdown('<div class="glass-container">', unsafe_allow_html=True)
     
     st.markdown("## ✏️ Manual Corrections")
     
-    receipts = st.session_state.processor.db.get_all_receipts()
+    db_version = _db_version()
+    receipts = _load_receipts(db_version)
     
     if not receipts:
         st.info("No receipts available for correction. Upload some receipts first!")
@@ -586,8 +726,7 @@ def corrections_page():
         return
     
     # Receipt selector
-    receipt_options = [f"{i}: {r.get('vendor', 'Unknown')} - {CURRENCIES.get(r.get('currency', 'USD'), '$')}{r.get('amount', 0):.2f} ({r.get('date', 'No date')})" 
-                      for i, r in enumerate(receipts)]
+    receipt_options = _receipt_labels(db_version)
     
     selected_receipt_idx = st.selectbox(
         "Select receipt to edit",
@@ -610,48 +749,46 @@ def corrections_page():
                 currency = st.selectbox(
                     "💱 Currency", 
                     options=list(CURRENCIES.keys()),
-                    index=list(CURRENCIES.keys()).index(receipt.get('currency', 'USD')),
+                    index=_CURRENCY_INDEX.get(receipt.get('currency', 'USD'), 0),
                     format_func=lambda x: f"{CURRENCIES[x]} {x}"
                 )
-                date = st.date_input("📅 Date", value=pd.to_datetime(receipt.get('date', datetime.now().date())))
+                date_parsed = _load_receipts_df(db_version)['date_parsed'].iloc[selected_receipt_idx]
+                date = st.date_input("📅 Date", value=date_parsed if pd.notna(date_parsed) else datetime.now().date())
                 
             with col2:
                 category = st.selectbox(
                     "🏷️ Category",
-                    options=['Food', 'Shopping', 'Gas', 'Entertainment', 'Healthcare', 'Transportation', 'Other'],
-                    index=['Food', 'Shopping', 'Gas', 'Entertainment', 'Healthcare', 'Transportation', 'Other'].index(receipt.get('category', 'Other'))
+                    options=CATEGORIES,
+                    index=_CATEGORY_INDEX.get(receipt.get('category', 'Other'), _CATEGORY_INDEX['Other'])
                 )
                 tax = st.number_input("💸 Tax", value=float(receipt.get('tax', 0)), min_value=0.0, step=0.01)
                 language = st.selectbox(
                     "🌐 Language",
                     options=list(LANGUAGES.keys()),
-                    index=list(LANGUAGES.keys()).index(receipt.get('language', 'en')),
+                    index=_LANGUAGE_INDEX.get(receipt.get('language', 'en'), 0),
                     format_func=lambda x: f"{LANGUAGES[x]} ({x})"
                 )
                 confidence = st.slider("🎯 Confidence Score", 0.0, 100.0, receipt.get('confidence', 90.0), 0.1)
             
-            # Items section
+            # Items section: one editable table, rows can be added or removed in place
             st.markdown("### 🛍️ Items")
-            items = receipt.get('items', [])
-            
-            # Display existing items
-            for i, item in enumerate(items):
-                st.markdown(f"**Item {i+1}:**")
-                item_col1, item_col2, item_col3 = st.columns([2, 1, 1])
-                with item_col1:
-                    item['name'] = st.text_input(f"Item {i+1} Name", value=item.get('name', ''), key=f"item_name_{i}")
-                with item_col2:
-                    item['price'] = st.number_input(f"Item {i+1} Price", value=float(item.get('price', 0)), min_value=0.0, step=0.01, key=f"item_price_{i}")
-                with item_col3:
-                    item['quantity'] = st.number_input(f"Item {i+1} Qty", value=int(item.get('quantity', 1)), min_value=1, key=f"item_qty_{i}")
+            edited_items = st.data_editor(
+                pd.DataFrame(receipt.get('items', []), columns=['name', 'price', 'quantity']),
+                num_rows="dynamic",
+                use_container_width=True,
+                key=f"items_editor_{selected_receipt_idx}",
+                column_config={
+                    'name': st.column_config.TextColumn("Name"),
+                    'price': st.column_config.NumberColumn("Price", min_value=0.0, step=0.01),
+                    'quantity': st.column_config.NumberColumn("Qty", min_value=1, step=1, default=1)
+                }
+            )
             
-            col_btn1, col_btn2, col_btn3 = st.columns(3)
+            col_btn1, col_btn2 = st.columns(2)
             
             with col_btn1:
                 save_changes = st.form_submit_button("💾 Save Changes", type="primary")
             with col_btn2:
-                add_item = st.form_submit_button("➕ Add Item")
-            with col_btn3:
                 delete_receipt = st.form_submit_button("🗑️ Delete Receipt", type="secondary")
             
             if save_changes:
@@ -666,24 +803,18 @@ def corrections_page():
                     'tax': tax,
                     'language': language,
                     'confidence': confidence,
-                    'items': items,
+                    'items': edited_items.to_dict(orient='records'),
                     'last_modified': datetime.now().isoformat()
                 }
                 
-                if st.session_state.processor.db.update_receipt(selected_receipt_idx, updated_receipt):
+                if get_processor().db.update_receipt(selected_receipt_idx, updated_receipt):
                     st.success("✅ Receipt updated successfully!")
                     st.rerun()
                 else:
                     st.error("❌ Failed to update receipt")
             
-            if add_item:
-                # Add new empty item
-                items.append({'name': '', 'price': 0.0, 'quantity': 1})
-                receipt['items'] = items
-                st.rerun()
-            
             if delete_receipt:
-                if st.session_state.processor.db.delete_receipt(selected_receipt_idx):
+                if get_processor().db.delete_receipt(selected_receipt_idx):
                     st.success("✅ Receipt deleted successfully!")
                     st.rerun()
                 else:
@@ -691,11 +822,13 @@ def corrections_page():
     
     st.markdown('</div>', unsafe_allow_html=True)
 
+@st.fragment
 def analytics_page():
     """Enhanced analytics dashboard with export functionality"""
     st.markdown('<div class="glass-container">', unsafe_allow_html=True)
     
-    dashboard_data = st.session_state.processor.get_dashboard_data()
+    dashboard_data = get_processor().get_dashboard_data()
+    df = _load_receipts_df(_db_version())
     
     if not dashboard_data.get('summary'):
         st.warning("📊 No data available. Upload receipts to see analytics!")
@@ -717,73 +850,68 @@ def analytics_page():
     display_summary_metrics(dashboard_data['summary'])
     
     # Multi-currency summary
-    display_currency_summary()
+    display_currency_summary(df)
     
     # Tabs for different views
     tab1, tab2, tab3, tab4, tab5 = st.tabs(["📈 Overview", "🏪 Vendors", "📊 Categories", "📅 Timeline", "🌍 Multi-Currency"])
     
+    # Group once per render; the views share the grouping work
+    gb_cat = df.groupby('category', observed=True)
+    gb_vendor = df.groupby('vendor', observed=True)
+    
     with tab1:
-        display_overview_charts(dashboard_data)
+        display_overview_charts(df, gb_cat, gb_vendor)
     
     with tab2:
-        display_vendor_analysis(dashboard_data.get('vendors', {}))
+        display_vendor_analysis(df, gb_vendor)
     
     with tab3:
-        display_category_analysis()
+        display_category_analysis(df, gb_cat)
     
     with tab4:
-        display_timeline_analysis()
+        display_timeline_analysis(df)
     
     with tab5:
-        display_multicurrency_analysis()
+        display_multicurrency_analysis(df)
     
     st.markdown('</div>', unsafe_allow_html=True)
 
+def _to_csv_bytes(df):
+    """UTF-8 CSV for downloads, written into a byte buffer in row chunks"""
+    buffer = io.BytesIO()
+    df.to_csv(buffer, index=False, encoding='utf-8', chunksize=10_000)
+    return buffer.getvalue()
+
+def _to_json_bytes(data, indent=True):
+    """UTF-8 JSON for downloads (pretty-printed unless indent=False), via orjson when available"""
+    if HAS_ORJSON:
+        # json turns non-str keys (e.g. a NULL category) into strings; match it
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(data, option=option, default=str)
+    return json.dumps(data, indent=2 if indent else None, default=str).encode('utf-8')
+
 def export_data_csv():
     """Export receipts data to CSV"""
-    receipts = st.session_state.processor.db.get_all_receipts()
-    if not receipts:
+    df = _load_receipts_df(_db_version())
+    if df.empty:
         st.error("No data to export")
         return
     
-    # Flatten the data for CSV export
-    flattened_data = []
-    for receipt in receipts:
-        base_data = {
-            'filename': receipt.get('filename', ''),
-            'vendor': receipt.get('vendor', ''),
-            'amount': receipt.get('amount', 0),
-            'currency': receipt.get('currency', 'USD'),
-            'date': receipt.get('date', ''),
-            'category': receipt.get('category', ''),
-            'tax': receipt.get('tax', 0),
-            'language': receipt.get('language', 'en'),
-            'confidence': receipt.get('confidence', 0),
-            'upload_date': receipt.get('upload_date', ''),
-            'last_modified': receipt.get('last_modified', '')
-        }
-        
-        # Add items as separate columns or rows
-        items = receipt.get('items', [])
-        if items:
-            for i, item in enumerate(items):
-                item_data = base_data.copy()
-                item_data.update({
-                    f'item_{i+1}_name': item.get('name', ''),
-                    f'item_{i+1}_price': item.get('price', 0),
-                    f'item_{i+1}_quantity': item.get('quantity', 0)
-                })
-                flattened_data.append(item_data)
-        else:
-            flattened_data.append(base_data)
+    # One row per receipt, or per item for receipts that have items
+    df = df.reindex(columns=[*CSV_EXPORT_COLUMNS, 'items'])
+    # Back to plain strings, so defaults outside the categories can be filled in
+    df = df.astype(dict.fromkeys(_CATEGORICAL_COLUMNS, object)).fillna(CSV_EXPORT_DEFAULTS)
+    df = df.explode('items', ignore_index=True)
     
-    df = pd.DataFrame(flattened_data)
-    csv_buffer = io.StringIO()
-    df.to_csv(csv_buffer, index=False)
+    item_rows = df.pop('items')
+    has_item = item_rows.notna()
+    if has_item.any():
+        items = pd.json_normalize(item_rows[has_item].tolist()).add_prefix('item_')
+        df = df.join(items.set_axis(item_rows.index[has_item]))
     
     st.download_button(
         label="📥 Download CSV Export",
-        data=csv_buffer.getvalue(),
+        data=_to_csv_bytes(df),
         file_name=f"receipts_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
         mime="text/csv",
         use_container_width=True
@@ -792,170 +920,163 @@ def export_data_csv():
 
 def export_data_json():
     """Export receipts data to JSON"""
-    receipts = st.session_state.processor.db.get_all_receipts()
+    db_version = _db_version()
+    receipts = _load_receipts(db_version)
     if not receipts:
         st.error("No data to export")
         return
     
+    # Summary statistics come from the cleaned, cached frame
+    df = _load_receipts_df(db_version)
+    total_amount = float(df['amount'].sum())
+    
     # Create comprehensive JSON export
     export_data = {
         'export_info': {
             'timestamp': datetime.now().isoformat(),
             'total_receipts': len(receipts),
-            'currencies_detected': list(set(r.get('currency', 'USD') for r in receipts)),
-            'languages_detected': list(set(r.get('language', 'en') for r in receipts)),
+            'currencies_detected': df['currency'].unique().tolist(),
+            'languages_detected': df['language'].unique().tolist(),
             'export_version': '1.0'
         },
         'summary_statistics': {
-            'total_amount': sum(r.get('amount', 0) for r in receipts),
-            'average_amount': sum(r.get('amount', 0) for r in receipts) / len(receipts) if receipts else 0,
-            'categories': list(set(r.get('category', 'Other') for r in receipts)),
-            'vendors': list(set(r.get('vendor', 'Unknown') for r in receipts))
+            'total_amount': total_amount,
+            'average_amount': total_amount / len(receipts) if receipts else 0,
+            'categories': df['category'].unique().tolist(),
+            'vendors': df['vendor'].astype(object).fillna('Unknown').unique().tolist()
         },
         'receipts': receipts
     }
     
-    json_str = json.dumps(export_data, indent=2, default=str)
-    
     st.download_button(
         label="📁 Download JSON Export",
-        data=json_str,
+        data=_to_json_bytes(export_data),
         file_name=f"receipts_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
         mime="application/json",
         use_container_width=True
     )
     st.success("✅ JSON export ready for download!")
 
-def display_currency_summary():
+def display_currency_summary(df):
     """Display multi-currency summary"""
-    receipts = st.session_state.processor.db.get_all_receipts()
-    
-    if not receipts:
+    if df.empty:
         return
     
     st.markdown("### 💱 Multi-Currency Summary")
     
-    # Group by currency
-    currency_totals = {}
-    for receipt in receipts:
-        currency = receipt.get('currency', 'USD')
-        amount = receipt.get('amount', 0)
-        if currency not in currency_totals:
-            currency_totals[currency] = {'total': 0, 'count': 0}
-        currency_totals[currency]['total'] += amount
-        currency_totals[currency]['count'] += 1
-    
-    # Display currency cards
-    cols = st.columns(len(currency_totals))
-    
-    for i, (currency, data) in enumerate(currency_totals.items()):
-        with cols[i]:
-            st.markdown(f"""
+    # Group by currency, in order of first appearance
+    stats = df.groupby('currency', observed=True, sort=False)['amount'].agg(total='sum', count='size')
+    
+    # Display currency cards, one column each, in a single markdown element
+    cards = ''.join(f"""
                 <div class="metric-card">
-                    <div style="font-size: 1.5rem; margin-bottom: 0.5rem;">{CURRENCIES.get(currency, currency)}</div>
-                    <div class="metric-value">{data['total']:,.2f}</div>
-                    <div class="metric-label">{data['count']} receipts</div>
-                </div>
-            """, unsafe_allow_html=True)
+                    <div style="font-size: 1.5rem; margin-bottom: 0.5rem;">{CURRENCIES.get(row.Index, row.Index)}</div>
+                    <div class="metric-value">{row.total:,.2f}</div>
+                    <div class="metric-label">{row.count} receipts</div>
+                </div>""" for row in stats.itertuples())
+    st.markdown(f'<div class="metrics-grid" style="grid-template-columns: repeat({len(stats)}, 1fr);">{cards}</div>',
+                unsafe_allow_html=True)
 
 def display_summary_metrics(summary):
     """Display summary metrics with light theme"""
     st.markdown("## 📊 Financial Overview")
     
-    col1, col2, col3, col4, col5 = st.columns(5)
-    
     metrics = [
-        (col1, "💰", f"${summary.get('total_spent', 0):,.2f}", "Total Spend"),
-        (col2, "📊", f"${summary.get('avg_amount', 0):.2f}", "Average"),
-        (col3, "📄", f"{summary.get('total_receipts', 0):,}", "Receipts"),
-        (col4, "📈", f"${summary.get('median_spend', 0):.2f}", "Median"),
-        (col5, "🎯", f"${summary.get('max_amount', 0):.2f}", "Highest")
+        ("💰", f"${summary.get('total_spent', 0):,.2f}", "Total Spend"),
+        ("📊", f"${summary.get('avg_amount', 0):.2f}", "Average"),
+        ("📄", f"{summary.get('total_receipts', 0):,}", "Receipts"),
+        ("📈", f"${summary.get('median_spend', 0):.2f}", "Median"),
+        ("🎯", f"${summary.get('max_amount', 0):.2f}", "Highest")
     ]
     
-    for col, icon, value, label in metrics:
-        with col:
-            st.markdown(f"""
+    # Five cards side by side, in a single markdown element
+    cards = ''.join(f"""
                 <div class="metric-card">
                     <div style="font-size: 2rem; margin-bottom: 0.5rem;">{icon}</div>
                     <div class="metric-value">{value}</div>
                     <div class="metric-label">{label}</div>
-                </div>
-            """, unsafe_allow_html=True)
+                </div>""" for icon, value, label in metrics)
+    st.markdown(f'<div class="metrics-grid" style="grid-template-columns: repeat(5, 1fr);">{cards}</div>',
+                unsafe_allow_html=True)
 
-def display_overview_charts(dashboard_data):
-    """Display overview charts with light theme"""
-    receipts = st.session_state.processor.db.get_all_receipts()
+# Chart figures depend only on the receipts, so they are built once per DB
+# version and shared across reruns. Arguments with a leading underscore are
+# not hashed; db_version is the cache key. Treat the figures as read-only.
+
+@st.cache_resource(ttl=60, show_spinner=False)
+def _overview_figures(db_version: int, _gb_cat, _gb_vendor):
+    """Category pie (None when nothing was spent) and top-vendor bar chart"""
+    import plotly.express as px  # only the chart views need plotly
+    
+    # Spending by category pie chart
+    category_spending = _gb_cat['amount'].sum()
+    # Only plot categories with nonzero spending
+    category_spending = category_spending[category_spending > 0]
+    fig_pie = None
+    if not category_spending.empty:
+        fig_pie = px.pie(
+            values=category_spending.values,
+            names=category_spending.index,
+            title="💰 Spending by Category",
+            color_discrete_sequence=px.colors.qualitative.Pastel
+        )
+        fig_pie.update_layout(
+            paper_bgcolor='rgba(0,0,0,0)',
+            plot_bgcolor='rgba(0,0,0,0)',
+            font_color='#2d3748'
+        )
     
-    if not receipts:
+    # Top vendors bar chart
+    vendor_spending = _gb_vendor['amount'].sum().sort_values(ascending=True).tail(10)
+    fig_bar = px.bar(
+        x=vendor_spending.values,
+        y=vendor_spending.index,
+        orientation='h',
+        title="🏪 Top Vendors by Spending",
+        color=vendor_spending.values,
+        color_continuous_scale='Viridis'
+    )
+    fig_bar.update_layout(
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font_color='#2d3748',
+        showlegend=False
+    )
+    return fig_pie, fig_bar
+
+def display_overview_charts(df, gb_cat, gb_vendor):
+    """Display overview charts with light theme"""
+    if df.empty:
         st.info("No data available for charts")
         return
     
-    df = pd.DataFrame(receipts)
-    if 'category' not in df.columns:
-        df['category'] = 'Other'
-    df['category'] = df['category'].fillna('Other')
-    if 'amount' not in df.columns:
-        df['amount'] = 0.0
-    df['amount'] = pd.to_numeric(df['amount'], errors='coerce').fillna(0.0)
+    fig_pie, fig_bar = _overview_figures(_db_version(), gb_cat, gb_vendor)
     
     col1, col2 = st.columns(2)
     
     with col1:
-        # Spending by category pie chart
-        category_spending = df.groupby('category')['amount'].sum()
-        # Only plot categories with nonzero spending
-        category_spending = category_spending[category_spending > 0]
-        if not category_spending.empty:
-            fig_pie = px.pie(
-                values=category_spending.values,
-                names=category_spending.index,
-                title="💰 Spending by Category",
-                color_discrete_sequence=px.colors.qualitative.Pastel
-            )
-            fig_pie.update_layout(
-                paper_bgcolor='rgba(0,0,0,0)',
-                plot_bgcolor='rgba(0,0,0,0)',
-                font_color='#2d3748'
-            )
+        if fig_pie is not None:
             st.plotly_chart(fig_pie, use_container_width=True)
         else:
             st.info("No category spending data to display.")
     
     with col2:
-        # Top vendors bar chart
-        vendor_spending = df.groupby('vendor')['amount'].sum().sort_values(ascending=True).tail(10)
-        fig_bar = px.bar(
-            x=vendor_spending.values,
-            y=vendor_spending.index,
-            orientation='h',
-            title="🏪 Top Vendors by Spending",
-            color=vendor_spending.values,
-            color_continuous_scale='Viridis'
-        )
-        fig_bar.update_layout(
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(0,0,0,0)',
-            font_color='#2d3748',
-            showlegend=False
-        )
         st.plotly_chart(fig_bar, use_container_width=True)
 
-def display_vendor_analysis(vendors_data):
+def display_vendor_analysis(df, gb_vendor):
     """Display vendor analysis with enhanced features"""
-    receipts = st.session_state.processor.db.get_all_receipts()
-    
-    if not receipts:
+    if df.empty:
         st.info("No vendor data available")
         return
     
-    df = pd.DataFrame(receipts)
-    agg_dict = {'amount': ['sum', 'mean', 'count']}
-    if 'currency' in df.columns:
-        agg_dict['currency'] = lambda x: ', '.join(set(x))
+    agg_dict = {
+        'amount': ['sum', 'mean', 'count'],
+        'currency': lambda x: ', '.join(set(x))
+    }
     
-    vendor_stats = df.groupby('vendor').agg(agg_dict).round(2)
+    vendor_stats = gb_vendor.agg(agg_dict).round(2)
     
-    vendor_stats.columns = ['Total Spent', 'Average Amount', 'Transactions'] + (["Currencies"] if 'currency' in df.columns else [])
+    vendor_stats.columns = ['Total Spent', 'Average Amount', 'Transactions', 'Currencies']
     
     st.markdown("### 🏪 Vendor Analysis")
     st.dataframe(vendor_stats, use_container_width=True)
@@ -974,99 +1095,125 @@ def display_vendor_analysis(vendors_data):
         with col3:
             st.metric("Avg per Transaction", f"${vendor_data['amount'].mean():.2f}")
 
-def display_category_analysis():
+@st.cache_resource(ttl=60, show_spinner=False)
+def _category_treemap(db_version: int, _df):
+    """Treemap of spending per category"""
+    import plotly.express as px
+    
+    fig_category = px.treemap(
+        _df, 
+        path=['category'], 
+        values='amount',
+        title="🌳 Category Spending Distribution"
+    )
+    fig_category.update_layout(
+        paper_bgcolor='rgba(0,0,0,0)',
+        font_color='#2d3748'
+    )
+    return fig_category
+
+def display_category_analysis(df, gb_cat):
     """Display category analysis with enhanced visualization"""
-    receipts = st.session_state.processor.db.get_all_receipts()
-    
-    if not receipts:
+    if df.empty:
         st.info("No category data available")
         return
     
-    df = pd.DataFrame(receipts)
-    agg_dict = {'amount': ['sum', 'mean', 'count', 'std']}
-    if 'currency' in df.columns:
-        agg_dict['currency'] = lambda x: len(set(x))
+    agg_dict = {
+        'amount': ['sum', 'mean', 'count', 'std'],
+        'currency': lambda x: len(set(x))
+    }
     
-    category_stats = df.groupby('category').agg(agg_dict).round(2)
+    category_stats = gb_cat.agg(agg_dict).round(2)
     
-    base_cols = ['Total', 'Average', 'Count', 'Std Dev']
-    if 'currency' in df.columns:
-        category_stats.columns = base_cols + ["Currencies"]
-    else:
-        category_stats.columns = base_cols
+    category_stats.columns = ['Total', 'Average', 'Count', 'Std Dev', 'Currencies']
     
     st.markdown("### 📊 Category Breakdown")
     st.dataframe(category_stats, use_container_width=True)
     
     # Category trend chart
     if len(df) > 1:
-        fig_category = px.treemap(
-            df, 
-            path=['category'], 
-            values='amount',
-            title="🌳 Category Spending Distribution"
-        )
-        fig_category.update_layout(
-            paper_bgcolor='rgba(0,0,0,0)',
-            font_color='#2d3748'
-        )
+        fig_category = _category_treemap(_db_version(), df)
         st.plotly_chart(fig_category, use_container_width=True)
 
-def display_timeline_analysis():
+@st.cache_resource(ttl=60, show_spinner=False)
+def _daily_spending_figure(db_version: int, _df):
+    """Daily spending line chart, or None with fewer than two days of data"""
+    import plotly.express as px
+    
+    daily_spending = _df.groupby('date_day')['amount'].sum()
+    if len(daily_spending) <= 1:
+        return None
+    
+    fig_line = px.line(
+        x=daily_spending.index,
+        y=daily_spending.values,
+        title="📅 Daily Spending Trend",
+        labels={'x': 'Date', 'y': 'Amount ($)'}
+    )
+    fig_line.update_layout(
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font_color='#2d3748'
+    )
+    return fig_line
+
+def display_timeline_analysis(df):
     """Display timeline analysis with date-based insights"""
-    receipts = st.session_state.processor.db.get_all_receipts()
-    
-    if not receipts:
+    if df.empty:
         st.info("No timeline data available")
         return
     
-    df = pd.DataFrame(receipts)
-    df['date'] = pd.to_datetime(df['date'])
-    
     # Daily spending trend
-    daily_spending = df.groupby(df['date'].dt.date)['amount'].sum()
-    
-    if len(daily_spending) > 1:
-        fig_line = px.line(
-            x=daily_spending.index,
-            y=daily_spending.values,
-            title="📅 Daily Spending Trend",
-            labels={'x': 'Date', 'y': 'Amount ($)'}
-        )
-        fig_line.update_layout(
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(0,0,0,0)',
-            font_color='#2d3748'
-        )
+    fig_line = _daily_spending_figure(_db_version(), df)
+    if fig_line is not None:
         st.plotly_chart(fig_line, use_container_width=True)
     
     # Monthly summary
     if len(df) > 0:
-        monthly_stats = df.groupby(df['date'].dt.to_period('M')).agg({
+        monthly_stats = df.groupby('date_month').agg({
             'amount': ['sum', 'count', 'mean']
-        }).round(2)
+        }).round(2).rename_axis('date')
         monthly_stats.columns = ['Total Spent', 'Transactions', 'Average Amount']
         
         st.markdown("### 📅 Monthly Summary")
         st.dataframe(monthly_stats, use_container_width=True)
 
-def display_multicurrency_analysis():
-    """Display multi-currency analysis"""
-    receipts = st.session_state.processor.db.get_all_receipts()
-
-    if not receipts:
-        st.info("No currency data available")
-        return
+@st.cache_resource(ttl=60, show_spinner=False)
+def _currency_pie(db_version: int, _df):
+    """Pie chart of spending per currency"""
+    import plotly.express as px
 
-    df = pd.DataFrame(receipts)
+    currency_totals = _df.groupby('currency', observed=True)['amount'].sum()
+    fig_currency = px.pie(
+        values=currency_totals.values,
+        names=[f"{CURRENCIES.get(curr, curr)} {curr}" for curr in currency_totals.index],
+        title="💰 Spending Distribution by Currency"
+    )
+    fig_currency.update_layout(
+        paper_bgcolor='rgba(0,0,0,0)',
+        font_color='#2d3748'
+    )
+    return fig_currency
 
-    if 'currency' not in df.columns or df['currency'].isnull().all():
-        st.warning("⚠️ Currency data not available in receipts.")
+def display_multicurrency_analysis(df):
+    """Display multi-currency analysis"""
+    if df.empty:
+        st.info("No currency data available")
         return
 
-    # Currency distribution
-    if 'amount' in df.columns and 'vendor' in df.columns:
-        currency_stats = df.groupby('currency').agg({
+    # Currency distribution; a single currency has nothing to break down
+    if df['currency'].nunique() == 1:
+        currency = df['currency'].dropna().iloc[0]
+        st.markdown("### 💱 Currency Analysis")
+        st.markdown(f"""
+            <div class="metric-card">
+                <div style="font-size: 1.5rem; margin-bottom: 0.5rem;">{CURRENCIES.get(currency, currency)} {currency}</div>
+                <div class="metric-value">{df['amount'].sum():,.2f}</div>
+                <div class="metric-label">{len(df)} receipts</div>
+            </div>
+        """, unsafe_allow_html=True)
+    else:
+        currency_stats = df.groupby('currency', observed=True).agg({
             'amount': ['sum', 'count', 'mean'],
             'vendor': 'nunique'
         }).round(2)
@@ -1076,42 +1223,34 @@ def display_multicurrency_analysis():
         st.dataframe(currency_stats, use_container_width=True)
 
         # Currency pie chart
-        currency_totals = df.groupby('currency')['amount'].sum()
-        fig_currency = px.pie(
-            values=currency_totals.values,
-            names=[f"{CURRENCIES.get(curr, curr)} {curr}" for curr in currency_totals.index],
-            title="💰 Spending Distribution by Currency"
-        )
-        fig_currency.update_layout(
-            paper_bgcolor='rgba(0,0,0,0)',
-            font_color='#2d3748'
-        )
+        fig_currency = _currency_pie(_db_version(), df)
         st.plotly_chart(fig_currency, use_container_width=True)
-    else:
-        st.warning("⚠️ Amount or vendor data missing for currency analysis.")
 
     # Language distribution
-    if 'language' in df.columns:
-        language_stats = df['language'].value_counts()
-        col1, col2 = st.columns(2)
-        with col1:
-            st.markdown("### 🌐 Language Distribution")
-            for lang, count in language_stats.items():
-                st.markdown(f'<span class="language-indicator">{LANGUAGES.get(lang, lang)}: {count}</span>', unsafe_allow_html=True)
+    language_stats = df['language'].value_counts()
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("### 🌐 Language Distribution")
+        for lang, count in language_stats.items():
+            st.markdown(f'<span class="language-indicator">{LANGUAGES.get(lang, lang)}: {count}</span>', unsafe_allow_html=True)
 
+@st.fragment
 def search_page():
     """Enhanced search and filter page"""
     st.markdown('<div class="glass-container">', unsafe_allow_html=True)
     
     st.markdown("## 🔍 Search & Filter Receipts")
     
-    receipts = st.session_state.processor.db.get_all_receipts()
+    db_version = _db_version()
+    df = _load_receipts_df(db_version)
     
-    if not receipts:
+    if df.empty:
         st.info("No receipts available to search")
         st.markdown('</div>', unsafe_allow_html=True)
         return
     
+    options = _search_options(db_version)
+    
     # Enhanced search filters
     col1, col2, col3, col4 = st.columns(4)
     
@@ -1119,88 +1258,80 @@ def search_page():
         search_vendor = st.text_input("🏪 Search by Vendor")
     
     with col2:
-        df = pd.DataFrame(receipts)
-        if 'currency' not in df.columns:
-            df['currency'] = 'USD'
-        categories = ['All'] + list(df['category'].unique())
+        categories = ['All'] + options['categories']
         selected_category = st.selectbox("🏷️ Filter by Category", categories)
     
     with col3:
-        currencies = ['All'] + list(df['currency'].unique())
+        currencies = ['All'] + options['currencies']
         selected_currency = st.selectbox("💱 Filter by Currency", currencies)
     
     with col4:
-        languages = ['All'] + list(df['language'].unique()) if 'language' in df.columns else ['All']
+        languages = ['All'] + options['languages']
         selected_language = st.selectbox("🌐 Filter by Language", languages)
     
     # Date range filter
     col5, col6 = st.columns(2)
     with col5:
-        start_date = st.date_input("📅 Start Date", value=pd.to_datetime(df['date']).min().date())
+        start_date = st.date_input("📅 Start Date", value=options['date_min'])
     with col6:
-        end_date = st.date_input("📅 End Date", value=pd.to_datetime(df['date']).max().date())
+        end_date = st.date_input("📅 End Date", value=options['date_max'])
     
     # Amount range filter
     amount_range = st.slider(
         "💰 Amount Range",
         min_value=0.0,
-        max_value=float(max(r['amount'] for r in receipts)),
-        value=(0.0, float(max(r['amount'] for r in receipts)))
+        max_value=options['amount_max'],
+        value=(0.0, options['amount_max'])
     )
     
-    # Apply filters
-    filtered_receipts = receipts
+    # Apply filters as boolean masks over the cached frame
+    mask = pd.Series(True, index=df.index)
     
     if search_vendor:
-        filtered_receipts = [r for r in filtered_receipts if search_vendor.lower() in r.get('vendor', '').lower()]
+        mask &= df['vendor'].str.lower().str.contains(search_vendor.lower(), regex=False, na=False)
     
     if selected_category != 'All':
-        filtered_receipts = [r for r in filtered_receipts if r.get('category') == selected_category]
+        mask &= df['category'].eq(selected_category)
     
     if selected_currency != 'All':
-        filtered_receipts = [r for r in filtered_receipts if r.get('currency') == selected_currency]
+        mask &= df['currency'].eq(selected_currency)
     
     if selected_language != 'All':
-        filtered_receipts = [r for r in filtered_receipts if r.get('language') == selected_language]
-    
-    # Date filter
-    filtered_receipts = [r for r in filtered_receipts 
-                        if start_date <= pd.to_datetime(r.get('date')).date() <= end_date]
+        mask &= df['language'].eq(selected_language)
     
-    # Amount filter
-    filtered_receipts = [r for r in filtered_receipts 
-                        if amount_range[0] <= r.get('amount', 0) <= amount_range[1]]
+    # Date and amount filters as one compound expression on the narrowed
+    # frame; query() evaluates it with numexpr when that is installed
+    start_ts, end_ts = pd.Timestamp(start_date), pd.Timestamp(end_date)
+    min_amount, max_amount = amount_range
+    df_filtered = df[mask].query(
+        '@start_ts <= date_parsed <= @end_ts and @min_amount <= amount <= @max_amount'
+    ).drop(columns=['date_parsed', 'date_day', 'date_month'])
     
     # Display results
-    st.markdown(f"### Found {len(filtered_receipts)} receipts")
-    
-    if filtered_receipts:
-        df_filtered = pd.DataFrame(filtered_receipts)
-        if 'currency' not in df_filtered.columns:
-            df_filtered['currency'] = 'USD'
-        # Format currency display
-        df_filtered['formatted_amount'] = df_filtered.apply(
-            lambda row: f"{CURRENCIES.get(row['currency'], row['currency'])}{row['amount']:.2f}", 
-            axis=1
-        )
+    st.markdown(f"### Found {len(df_filtered)} receipts")
+    
+    if not df_filtered.empty:
+        # Format currency display: symbol lookup per currency, then one string concat
+        currency = df_filtered['currency'].astype(object)
+        symbols = currency.map(CURRENCIES).fillna(currency)
+        df_filtered['formatted_amount'] = symbols + df_filtered['amount'].map('{:.2f}'.format)
         
         display_cols = ['vendor', 'formatted_amount', 'category', 'date', 'currency', 'language']
-        available_cols = [col for col in display_cols if col in df_filtered.columns]
         
-        st.dataframe(df_filtered[available_cols], use_container_width=True)
+        st.dataframe(df_filtered[display_cols], use_container_width=True)
         
         # Export filtered results
         if st.button("📥 Export Filtered Results"):
-            csv = df_filtered.to_csv(index=False)
             st.download_button(
                 "📥 Download Filtered CSV",
-                data=csv,
+                data=_to_csv_bytes(df_filtered),
                 file_name=f"filtered_receipts_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
                 mime="text/csv"
             )
     
     st.markdown('</div>', unsafe_allow_html=True)
 
+@st.fragment
 def settings_page():
     """Enhanced settings and management page"""
     st.markdown('<div class="glass-container">', unsafe_allow_html=True)
@@ -1237,28 +1368,26 @@ def settings_page():
     
     with col1:
         if st.button("🗑️ Clear All Data", type="secondary"):
-            if st.session_state.processor.db.clear_all_data():
+            if get_processor().db.clear_all_data():
                 st.success("✅ All data cleared successfully!")
                 st.rerun()
     
     with col2:
-        receipts = st.session_state.processor.db.get_all_receipts()
+        receipts = _load_receipts(_db_version())
         if receipts:
-            df = pd.DataFrame(receipts)
-            csv = df.to_csv(index=False)
+            # Callables defer serialization until the button is clicked
             st.download_button(
                 "📥 Export All Data (CSV)",
-                data=csv,
+                data=lambda: _to_csv_bytes(pd.DataFrame(receipts)),
                 file_name=f"all_receipts_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
                 mime="text/csv"
             )
     
     with col3:
         if receipts:
-            json_str = json.dumps(receipts, indent=2, default=str)
             st.download_button(
                 "📁 Export All Data (JSON)",
-                data=json_str,
+                data=lambda: _to_json_bytes(receipts),
                 file_name=f"all_receipts_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
                 mime="application/json"
             )
@@ -1270,14 +1399,15 @@ def settings_page():
     
     with col1:
         st.markdown("#### Analytics Engine")
-        status = st.session_state.processor.get_status()
+        status = get_processor().get_status()
         st.success(f"Status: {status}")
         
         st.markdown("#### Data Statistics")
         if receipts:
-            total_receipts = len(receipts)
-            currencies_count = len(set(r.get('currency', 'USD') for r in receipts))
-            languages_count = len(set(r.get('language', 'en') for r in receipts))
+            df = _load_receipts_df(_db_version())
+            total_receipts = len(df)
+            currencies_count = df['currency'].nunique()
+            languages_count = df['language'].nunique()
             
             st.metric("Total Receipts", total_receipts)
             st.metric("Currencies Detected", currencies_count)
@@ -1285,14 +1415,14 @@ def settings_page():
     
     with col2:
         st.markdown("#### Performance Metrics")
-        metrics = st.session_state.processor.get_performance_metrics()
+        metrics = get_processor().get_performance_metrics()
         for metric, value in metrics.items():
             st.metric(metric, value)
         
         st.markdown("#### Storage Info")
         if receipts:
             # Calculate approximate storage usage
-            total_size = sum(len(str(receipt)) for receipt in receipts)
+            total_size = _storage_size(_db_version())
             st.metric("Approx. Storage Used", f"{total_size / 1024:.1f} KB")
     
     # Advanced settings
@@ -1,93 +1,460 @@
 import sqlite3
 import logging
+import threading
+from contextlib import contextmanager
 from datetime import datetime
+from functools import lru_cache
+from itertools import islice
+from pathlib import Path
 from typing import List, Dict, Any, Optional
 
 logger = logging.getLogger(__name__)
 
+_INSERT_RECEIPT_SQL = """
+    INSERT OR REPLACE INTO receipts 
+    (filename, vendor, date, amount, category, text, upload_date, file_hash)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+def _receipt_row(receipt):
+    """Parameters for _INSERT_RECEIPT_SQL, in column order"""
+    return (
+        receipt.filename, receipt.vendor, receipt.date,
+        receipt.amount, receipt.category, receipt.text,
+        receipt.upload_date, receipt.file_hash
+    )
+
+def _fetch_columnar(cursor):
+    """Result set as {column name: numpy array}, one array per column"""
+    import numpy as np  # only columnar callers need numpy
+    keys = tuple(column[0] for column in cursor.description)
+    rows = cursor.fetchall()
+    columns = zip(*rows) if rows else [()] * len(keys)
+    return {key: np.asarray(values) for key, values in zip(keys, columns)}
+
+def _rows_to_dicts(cursor):
+    """Yield each result row as a dict, reading the column names only once"""
+    keys = tuple(column[0] for column in cursor.description)
+    for row in cursor:
+        yield dict(zip(keys, row))
+
+# Schema, indexes and triggers, created in one script and one transaction
+_SCHEMA_SQL = """
+    BEGIN;
+
+    CREATE TABLE IF NOT EXISTS receipts (
+        id INTEGER PRIMARY KEY,
+        filename TEXT NOT NULL,
+        vendor TEXT NOT NULL,
+        date DATE NOT NULL,
+        amount REAL NOT NULL,
+        category TEXT,
+        text TEXT,
+        upload_date DATETIME,
+        file_hash TEXT UNIQUE
+    );
+
+    -- Add comprehensive indexes for better performance with analytics
+    CREATE INDEX IF NOT EXISTS idx_date ON receipts(date);
+    CREATE INDEX IF NOT EXISTS idx_vendor ON receipts(vendor);
+    CREATE INDEX IF NOT EXISTS idx_category ON receipts(category);
+    CREATE INDEX IF NOT EXISTS idx_amount ON receipts(amount);
+    CREATE INDEX IF NOT EXISTS idx_upload_date ON receipts(upload_date);
+    CREATE INDEX IF NOT EXISTS idx_file_hash ON receipts(file_hash);
+
+    -- Composite indexes for common query patterns
+    CREATE INDEX IF NOT EXISTS idx_vendor_date ON receipts(vendor, date);
+    CREATE INDEX IF NOT EXISTS idx_category_date ON receipts(category, date);
+
+    -- Analytics indexes: month expression for the monthly rollup, and
+    -- (category, amount) so the category summary is an index-only scan
+    CREATE INDEX IF NOT EXISTS idx_month ON receipts(substr(date, 1, 7));
+    CREATE INDEX IF NOT EXISTS idx_cat_amount ON receipts(category, amount);
+
+    -- Running count and total of receipts, kept current by triggers so
+    -- the spending summary doesn't re-aggregate the whole table
+    CREATE TABLE IF NOT EXISTS receipt_totals (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        receipt_count INTEGER NOT NULL,
+        total_amount REAL NOT NULL
+    );
+    INSERT OR IGNORE INTO receipt_totals (id, receipt_count, total_amount)
+    SELECT 1, COUNT(*), TOTAL(amount) FROM receipts;
+
+    CREATE TRIGGER IF NOT EXISTS trg_totals_insert AFTER INSERT ON receipts
+    BEGIN
+        UPDATE receipt_totals
+        SET receipt_count = receipt_count + 1,
+            total_amount = total_amount + IFNULL(NEW.amount, 0)
+        WHERE id = 1;
+    END;
+
+    -- Reset the total with the last row so float drift doesn't linger
+    CREATE TRIGGER IF NOT EXISTS trg_totals_delete AFTER DELETE ON receipts
+    BEGIN
+        UPDATE receipt_totals
+        SET receipt_count = receipt_count - 1,
+            total_amount = CASE WHEN receipt_count = 1 THEN 0
+                                ELSE total_amount - IFNULL(OLD.amount, 0) END
+        WHERE id = 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_totals_update AFTER UPDATE OF amount ON receipts
+    BEGIN
+        UPDATE receipt_totals
+        SET total_amount = total_amount - IFNULL(OLD.amount, 0) + IFNULL(NEW.amount, 0)
+        WHERE id = 1;
+    END;
+
+    COMMIT;
+"""
+
+# Trigram full-text index over the searchable text columns. It is an
+# external-content table (rows live in receipts), kept in sync by triggers;
+# trigrams make MATCH a case-insensitive substring test like LIKE '%q%'
+_FTS_SCHEMA_SQL = """
+    BEGIN;
+
+    CREATE VIRTUAL TABLE IF NOT EXISTS receipts_fts USING fts5(
+        filename, vendor, text,
+        content='receipts', content_rowid='id', tokenize='trigram'
+    );
+    INSERT INTO receipts_fts(receipts_fts) VALUES ('rebuild');
+
+    CREATE TRIGGER IF NOT EXISTS trg_fts_insert AFTER INSERT ON receipts
+    BEGIN
+        INSERT INTO receipts_fts(rowid, filename, vendor, text)
+        VALUES (NEW.id, NEW.filename, NEW.vendor, NEW.text);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_fts_delete AFTER DELETE ON receipts
+    BEGIN
+        INSERT INTO receipts_fts(receipts_fts, rowid, filename, vendor, text)
+        VALUES ('delete', OLD.id, OLD.filename, OLD.vendor, OLD.text);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_fts_update AFTER UPDATE OF filename, vendor, text ON receipts
+    BEGIN
+        INSERT INTO receipts_fts(receipts_fts, rowid, filename, vendor, text)
+        VALUES ('delete', OLD.id, OLD.filename, OLD.vendor, OLD.text);
+        INSERT INTO receipts_fts(rowid, filename, vendor, text)
+        VALUES (NEW.id, NEW.filename, NEW.vendor, NEW.text);
+    END;
+
+    COMMIT;
+"""
+
+# Trigrams can't match queries shorter than this; those fall back to LIKE
+_FTS_MIN_QUERY_LENGTH = 3
+
+# Spending summary. Count and total come from the trigger-maintained
+# receipt_totals row; each MIN/MAX is its own subquery so SQLite answers it
+# with one idx_amount/idx_date lookup. The median uses SQLite's percentile()
+# where available, else two scalar subqueries walk idx_amount to the lower
+# and upper middle rows (the same row when the count is odd). amount is
+# NOT NULL, so receipt_count counts the amounts. The paid_ columns skip the
+# 0.0 the parser falls back to when it finds no amount; paid_n is an
+# idx_amount range count.
+_MEDIAN_SQL = {
+    True: "(SELECT percentile(amount, 50) FROM receipts WHERE {where})",
+    False: """((SELECT amount FROM receipts WHERE {where}
+                          ORDER BY amount LIMIT 1 OFFSET (SELECT ({n} - 1) / 2 FROM counted))
+                        + (SELECT amount FROM receipts WHERE {where}
+                          ORDER BY amount LIMIT 1 OFFSET (SELECT {n} / 2 FROM counted))) / 2.0""",
+}
+_SPENDING_SUMMARY_SQL = {
+    has_percentile: f"""
+                    WITH counted AS (
+                        SELECT receipt_count AS n, total_amount,
+                               (SELECT COUNT(*) FROM receipts WHERE amount > 0) AS paid_n
+                        FROM receipt_totals WHERE id = 1
+                    )
+                    SELECT 
+                        n as total_receipts,
+                        total_amount as total_spent,
+                        total_amount / NULLIF(n, 0) as avg_amount,
+                        (SELECT MIN(amount) FROM receipts) as min_amount,
+                        (SELECT MAX(amount) FROM receipts) as max_amount,
+                        (SELECT MIN(date) FROM receipts) as earliest_date,
+                        (SELECT MAX(date) FROM receipts) as latest_date,
+                        {median_sql.format(where='amount IS NOT NULL', n='n')} as median_spend,
+                        (SELECT AVG(amount) FROM receipts WHERE amount > 0) as avg_paid_amount,
+                        {median_sql.format(where='amount > 0', n='paid_n')} as median_paid_spend
+                    FROM counted
+                """
+    for has_percentile, median_sql in _MEDIAN_SQL.items()
+}
+
+# SQL text is built once per shape and reused as the same string, so the
+# connection's statement cache hands back the already prepared statement
+
+# get_receipts: one statement per (order_by, ascending)
+_ORDER_FIELDS = ('id', 'filename', 'vendor', 'date', 'amount', 'category', 'upload_date')
+_GET_RECEIPTS_SQL = {
+    (field, ascending): f"""
+                    SELECT * FROM receipts 
+                    ORDER BY {field} {'ASC' if ascending else 'DESC'}
+                    LIMIT ? OFFSET ?
+                """
+    for field in _ORDER_FIELDS
+    for ascending in (True, False)
+}
+
+# search_receipts: WHERE predicates in the order their parameters are added.
+# The keyword predicate is swapped for _FTS_QUERY_PREDICATE when FTS is used.
+_FTS_QUERY_PREDICATE = "id IN (SELECT rowid FROM receipts_fts WHERE receipts_fts MATCH ?)"
+_SEARCH_PREDICATES = (
+    "(filename LIKE ? OR text LIKE ? OR vendor LIKE ?)",
+    "vendor LIKE ?",
+    "category LIKE ?",
+    "date >= ?",
+    "date <= ?",
+    "amount >= ?",
+    "amount <= ?",
+)
+
+@lru_cache(maxsize=None)
+def _search_sql(active, use_fts=False):
+    """Search query using the _SEARCH_PREDICATES flagged in the active tuple"""
+    predicates = _SEARCH_PREDICATES
+    if use_fts:
+        predicates = (_FTS_QUERY_PREDICATE,) + predicates[1:]
+    sql_query = "SELECT * FROM receipts WHERE 1=1"
+    for predicate, used in zip(predicates, active):
+        if used:
+            sql_query += f" AND {predicate}"
+    return sql_query + " ORDER BY date DESC"
+
+_UPDATABLE_FIELDS = ('filename', 'vendor', 'date', 'amount', 'category', 'text')
+
+# One entry per non-empty subset of _UPDATABLE_FIELDS (63)
+@lru_cache(maxsize=64)
+def _update_sql(fields):
+    """UPDATE statement setting the given (already validated) fields"""
+    return f"UPDATE receipts SET {', '.join(f'{field} = ?' for field in fields)} WHERE id = ?"
+
 class Database:
     """Enhanced database wrapper for receipts with analytics support"""
 
     def __init__(self, db_file="my_receipts.db"):
         self.db_file = db_file
+        # One connection for the object's lifetime instead of one per call.
+        # It is shared across threads, so every use goes through the lock.
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._configure_connection()
         self._setup_database()
+        self._has_fts = self._setup_search_index()
+        # Every stored file_hash (a superset once rows are deleted), so
+        # check_duplicate can answer "new file" without a query. None if
+        # loading failed, in which case every check goes to SQL. Our own
+        # writes add to it; commits by other connections move data_version,
+        # and a miss after that reloads the set first.
+        self._hashes_data_version = self._data_version()
+        self._known_hashes = self._load_known_hashes()
+        self._read_lock, self._read_conn = self._open_read_connection()
+        self._has_percentile = self._load_percentile(self._read_conn)
+
+    def _configure_connection(self):
+        """Set the journal and cache pragmas once for the shared connection"""
+        try:
+            # WAL lets readers run alongside the single writer; NORMAL sync
+            # is durable enough in WAL mode and skips most fsyncs
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA temp_store=MEMORY")
+            self._conn.execute("PRAGMA cache_size=-65536")
+            self._conn.execute("PRAGMA mmap_size=268435456")
+            # INSERT OR REPLACE deletes the old row; only with recursive
+            # triggers does that fire the receipt_totals delete trigger
+            self._conn.execute("PRAGMA recursive_triggers=ON")
+        except sqlite3.Error as e:
+            logger.warning(f"Could not apply connection pragmas: {e}")
+
+    def _load_percentile(self, conn):
+        """
+        Whether percentile() is available on conn for the median: built in
+        on SQLite builds with the percentile extension compiled in, otherwise
+        loaded from a system-installed percentile extension if allowed.
+        """
+        try:
+            conn.execute("SELECT percentile(1, 50)")
+            return True
+        except sqlite3.Error:
+            pass
+        try:
+            conn.enable_load_extension(True)
+            try:
+                conn.load_extension("percentile")
+            finally:
+                conn.enable_load_extension(False)
+            conn.execute("SELECT percentile(1, 50)")
+            return True
+        except (AttributeError, sqlite3.Error):
+            # AttributeError: this Python's sqlite3 can't load extensions
+            return False
+
+    def _open_read_connection(self):
+        """
+        Read-only connection for the analytics queries, with its own lock so
+        dashboard reads never queue behind an ingest holding the shared
+        connection (WAL lets them see the last committed state meanwhile).
+        Falls back to the shared connection and lock for in-memory databases
+        or if the file can't be opened read-only.
+        """
+        if self.db_file == ":memory:":
+            return self._lock, self._conn
+        try:
+            conn = sqlite3.connect(
+                f"{Path(self.db_file).resolve().as_uri()}?mode=ro",
+                uri=True, check_same_thread=False,
+            )
+            conn.execute("PRAGMA query_only=ON")
+            conn.execute("PRAGMA cache_size=-65536")
+            conn.execute("PRAGMA mmap_size=268435456")
+            return threading.Lock(), conn
+        except sqlite3.Error as e:
+            logger.warning(f"Read-only connection unavailable, analytics share the main one: {e}")
+            return self._lock, self._conn
+
+    @contextmanager
+    def _connection(self):
+        """Shared connection under the lock; commits on success, rolls back on error"""
+        with self._lock, self._conn:
+            yield self._conn
+
+    @contextmanager
+    def _read_connection(self):
+        """Read-only analytics connection under its own lock"""
+        with self._read_lock:
+            yield self._read_conn
+
+    @property
+    def write_count(self):
+        """Rows changed through this object so far; callers compare it to spot writes"""
+        return self._conn.total_changes
+
+    def close(self):
+        """Close the shared and read-only connections"""
+        with self._read_lock:
+            if self._read_conn is not self._conn:
+                self._read_conn.close()
+        with self._lock:
+            self._conn.close()
 
     def _setup_database(self):
-        """Create the receipts table if it doesn't exist"""
-        with sqlite3.connect(self.db_file) as conn:
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS receipts (
-                    id INTEGER PRIMARY KEY,
-                    filename TEXT NOT NULL,
-                    vendor TEXT NOT NULL,
-                    date DATE NOT NULL,
-                    amount REAL NOT NULL,
-                    category TEXT,
-                    text TEXT,
-                    upload_date DATETIME,
-                    file_hash TEXT UNIQUE
-                )
-            """)
-            
-            # Add comprehensive indexes for better performance with analytics
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_date ON receipts(date)")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_vendor ON receipts(vendor)")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_category ON receipts(category)")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_amount ON receipts(amount)")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_upload_date ON receipts(upload_date)")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_file_hash ON receipts(file_hash)")
-            
-            # Composite indexes for common query patterns
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_vendor_date ON receipts(vendor, date)")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_category_date ON receipts(category, date)")
+        """Create the receipts table, indexes and triggers if they don't exist"""
+        with self._connection() as conn:
+            conn.executescript(_SCHEMA_SQL)
+
+    def _load_known_hashes(self):
+        """Set of file hashes currently in the receipts table"""
+        try:
+            with self._connection() as conn:
+                cursor = conn.execute("SELECT file_hash FROM receipts WHERE file_hash IS NOT NULL")
+                return {file_hash for (file_hash,) in cursor}
+        except sqlite3.Error as e:
+            logger.error(f"Loading file hashes failed: {e}")
+            return None
+
+    def _data_version(self):
+        """PRAGMA data_version: changes when another connection commits"""
+        try:
+            with self._connection() as conn:
+                return conn.execute("PRAGMA data_version").fetchone()[0]
+        except sqlite3.Error as e:
+            logger.error(f"Reading data_version failed: {e}")
+            return None
+
+    def _hash_may_exist(self, file_hash):
+        """False only when file_hash is surely not stored, so SQL can be skipped"""
+        with self._lock:
+            if self._known_hashes is None or file_hash in self._known_hashes:
+                return True
+            data_version = self._data_version()
+            if data_version is None:
+                return True
+            if data_version != self._hashes_data_version:
+                # Another connection or process wrote since the set was loaded
+                self._hashes_data_version = data_version
+                self._known_hashes = self._load_known_hashes()
+                return self._known_hashes is None or file_hash in self._known_hashes
+            return False
+
+    def _remember_hashes(self, hashes):
+        """Add newly saved file hashes to the duplicate-check set"""
+        if self._known_hashes is not None:
+            self._known_hashes.update(h for h in hashes if h)
+
+    def _setup_search_index(self):
+        """Create the FTS5 keyword index if needed; False if SQLite can't provide one"""
+        try:
+            with self._connection() as conn:
+                exists = conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'receipts_fts'"
+                ).fetchone()
+                if not exists:
+                    conn.executescript(_FTS_SCHEMA_SQL)
+            return True
+        except sqlite3.Error as e:
+            logger.warning(f"Full-text index unavailable, keyword search uses LIKE: {e}")
+            return False
 
     def save_receipt(self, receipt):
         """Save a receipt to the database"""
         try:
-            with sqlite3.connect(self.db_file) as conn:
-                cursor = conn.execute("""
-                    INSERT OR REPLACE INTO receipts 
-                    (filename, vendor, date, amount, category, text, upload_date, file_hash)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    receipt.filename, receipt.vendor, receipt.date,
-                    receipt.amount, receipt.category, receipt.text,
-                    receipt.upload_date, receipt.file_hash
-                ))
+            with self._connection() as conn:
+                cursor = conn.execute(_INSERT_RECEIPT_SQL, _receipt_row(receipt))
+                self._remember_hashes((receipt.file_hash,))
                 return cursor.lastrowid
         except sqlite3.Error as e:
             logger.error(f"Database save failed: {e}")
             return None
 
-    def get_receipts(self, limit=100, offset=0, order_by='date', ascending=False):
-        """Get receipts with flexible ordering and pagination"""
+    def save_receipts(self, receipts, batch_size=10000):
+        """
+        Save many receipts in a single transaction, for bulk imports.
+        Rows go to executemany in batches of batch_size, so the INSERT is
+        prepared once and the iterable is never fully materialized.
+        Returns the number of receipts saved (0 if the transaction failed).
+        """
+        rows = map(_receipt_row, receipts)
+        saved = 0
         try:
-            with sqlite3.connect(self.db_file) as conn:
-                conn.row_factory = sqlite3.Row
-                
+            with self._connection() as conn:
+                while True:
+                    batch = list(islice(rows, batch_size))
+                    if not batch:
+                        break
+                    conn.executemany(_INSERT_RECEIPT_SQL, batch)
+                    self._remember_hashes(row[-1] for row in batch)
+                    saved += len(batch)
+            return saved
+        except sqlite3.Error as e:
+            logger.error(f"Bulk save failed: {e}")
+            return 0
+
+    def get_receipts(self, limit=100, offset=0, order_by='date', ascending=False, columnar=False):
+        """
+        Get receipts with flexible ordering and pagination;
+        columnar=True returns {column: numpy array}
+        """
+        try:
+            with self._connection() as conn:
                 # Validate order_by field to prevent SQL injection
-                valid_fields = ['id', 'filename', 'vendor', 'date', 'amount', 'category', 'upload_date']
-                if order_by not in valid_fields:
+                if order_by not in _ORDER_FIELDS:
                     order_by = 'date'
                 
-                order_direction = 'ASC' if ascending else 'DESC'
-                
-                cursor = conn.execute(f"""
-                    SELECT * FROM receipts 
-                    ORDER BY {order_by} {order_direction}
-                    LIMIT ? OFFSET ?
-                """, (limit, offset))
-                return [dict(row) for row in cursor.fetchall()]
+                cursor = conn.execute(_GET_RECEIPTS_SQL[order_by, bool(ascending)], (limit, offset))
+                return _fetch_columnar(cursor) if columnar else list(_rows_to_dicts(cursor))
         except sqlite3.Error as e:
             logger.error(f"Database query failed: {e}")
-            return []
+            return {} if columnar else []
 
     def get_all_receipts(self, limit=None):
         """Get all receipts for analytics processing"""
         try:
-            with sqlite3.connect(self.db_file) as conn:
-                conn.row_factory = sqlite3.Row
-                
+            with self._connection() as conn:
                 query = "SELECT * FROM receipts ORDER BY date DESC"
                 params = []
                 
@@ -96,11 +463,32 @@ class Database:
                     params.append(limit)
                 
                 cursor = conn.execute(query, params)
-                return [dict(row) for row in cursor.fetchall()]
+                return list(_rows_to_dicts(cursor))
         except sqlite3.Error as e:
             logger.error(f"Database query failed: {e}")
             return []
 
+    def iter_receipts(self, batch_size=1000):
+        """
+        Yield every receipt as a dict, newest first, fetching batch_size rows
+        at a time instead of loading the whole table. Uses its own
+        connection, so a slow consumer never holds the shared one.
+        """
+        conn = sqlite3.connect(self.db_file)
+        try:
+            cursor = conn.execute("SELECT * FROM receipts ORDER BY date DESC")
+            keys = tuple(column[0] for column in cursor.description)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(zip(keys, row))
+        except sqlite3.Error as e:
+            logger.error(f"Database query failed: {e}")
+        finally:
+            conn.close()
+
     def search_receipts(self, query: str = None, vendor: str = None, date_from: str = None, 
                        date_to: str = None, amount_min: float = None, amount_max: float = None,
                        category: str = None):
@@ -113,44 +501,76 @@ class Database:
         - amount_min/max: Range search for amount.
         """
         try:
-            with sqlite3.connect(self.db_file) as conn:
-                conn.row_factory = sqlite3.Row
-                
-                sql_query = "SELECT * FROM receipts WHERE 1=1"
+            with self._connection() as conn:
+                active = (
+                    bool(query), bool(vendor), bool(category), bool(date_from), bool(date_to),
+                    amount_min is not None, amount_max is not None
+                )
+                use_fts = bool(query) and self._has_fts and len(query) >= _FTS_MIN_QUERY_LENGTH
                 params = []
                 
-                if query:
-                    sql_query += " AND (filename LIKE ? OR text LIKE ? OR vendor LIKE ?)"
+                if use_fts:
+                    # Quoted as one FTS5 string so operators in the query are literal
+                    params.append('"' + query.replace('"', '""') + '"')
+                elif query:
                     params.extend([f"%{query}%", f"%{query}%", f"%{query}%"])
                 
                 if vendor:
-                    sql_query += " AND vendor LIKE ?"
                     params.append(f"%{vendor}%")
                 
                 if category:
-                    sql_query += " AND category LIKE ?"
                     params.append(f"%{category}%")
                     
                 if date_from:
-                    sql_query += " AND date >= ?"
                     params.append(date_from)
                 
                 if date_to:
-                    sql_query += " AND date <= ?"
                     params.append(date_to)
                     
                 if amount_min is not None:
-                    sql_query += " AND amount >= ?"
                     params.append(amount_min)
                 
                 if amount_max is not None:
-                    sql_query += " AND amount <= ?"
                     params.append(amount_max)
                 
-                sql_query += " ORDER BY date DESC"
+                cursor = conn.execute(_search_sql(active, use_fts), params)
+                return list(_rows_to_dicts(cursor))
+        except sqlite3.Error as e:
+            logger.error(f"Search query failed: {e}")
+            return []
+
+    def search_any_terms(self, terms, limit=1000):
+        """
+        Newest receipts whose filename, vendor, text or category contains
+        any of the terms (case-insensitive), up to limit. Terms of three or
+        more characters go through the full-text index in one MATCH; shorter
+        ones, and every term when there is no index, use LIKE.
+        """
+        terms = [term for term in terms if term]
+        if not terms:
+            return []
+        try:
+            with self._connection() as conn:
+                predicates = []
+                params = []
+                fts_terms = [term for term in terms if len(term) >= _FTS_MIN_QUERY_LENGTH] if self._has_fts else []
+                if fts_terms:
+                    predicates.append(_FTS_QUERY_PREDICATE)
+                    # Each term quoted as one FTS5 string, so operators in it are literal
+                    params.append(' OR '.join('"' + term.replace('"', '""') + '"' for term in fts_terms))
+                for term in terms:
+                    if term in fts_terms:
+                        predicates.append("category LIKE ?")
+                        params.append(f"%{term}%")
+                    else:
+                        predicates.append("(filename LIKE ? OR text LIKE ? OR vendor LIKE ? OR category LIKE ?)")
+                        params.extend([f"%{term}%"] * 4)
                 
-                cursor = conn.execute(sql_query, params)
-                return [dict(row) for row in cursor.fetchall()]
+                cursor = conn.execute(
+                    f"SELECT * FROM receipts WHERE {' OR '.join(predicates)} ORDER BY date DESC LIMIT ?",
+                    params + [limit]
+                )
+                return list(_rows_to_dicts(cursor))
         except sqlite3.Error as e:
             logger.error(f"Search query failed: {e}")
             return []
@@ -158,31 +578,12 @@ class Database:
     def get_spending_summary(self):
         """Get basic spending stats"""
         try:
-            with sqlite3.connect(self.db_file) as conn:
-                cursor = conn.execute("""
-                    SELECT 
-                        COUNT(*) as total_receipts,
-                        SUM(amount) as total_spent,
-                        AVG(amount) as avg_amount,
-                        MIN(amount) as min_amount,
-                        MAX(amount) as max_amount,
-                        MIN(date) as earliest_date,
-                        MAX(date) as latest_date
-                    FROM receipts
-                """)
+            with self._read_connection() as conn:
+                cursor = conn.execute(_SPENDING_SUMMARY_SQL[self._has_percentile])
                 row = cursor.fetchone()
-                # Median calculation
-                cursor2 = conn.execute("SELECT amount FROM receipts")
-                amounts = [r[0] for r in cursor2.fetchall() if r[0] is not None]
                 median_spend = 0
-                if amounts:
-                    amounts.sort()
-                    n = len(amounts)
-                    mid = n // 2
-                    if n % 2 == 0:
-                        median_spend = (amounts[mid - 1] + amounts[mid]) / 2
-                    else:
-                        median_spend = amounts[mid]
+                if row and row[7] is not None:
+                    median_spend = row[7]
                 if row:
                     return {
                         'total_receipts': row[0],
@@ -192,18 +593,19 @@ class Database:
                         'max_amount': round(row[4] or 0, 2),
                         'earliest_date': row[5],
                         'latest_date': row[6],
-                        'median_spend': round(median_spend, 2)
+                        'median_spend': round(median_spend, 2),
+                        'avg_paid_amount': round(row[8] or 0, 2),
+                        'median_paid_spend': round(row[9] or 0, 2)
                     }
         except sqlite3.Error as e:
             logger.error(f"Summary query failed: {e}")
         
         return {'error': 'Could not get summary'}
 
-    def get_category_summary(self):
-        """Get spending summary grouped by category"""
+    def get_category_summary(self, columnar=False):
+        """Get spending summary grouped by category; columnar=True returns {column: numpy array}"""
         try:
-            with sqlite3.connect(self.db_file) as conn:
-                conn.row_factory = sqlite3.Row
+            with self._read_connection() as conn:
                 cursor = conn.execute("""
                     SELECT 
                         category,
@@ -216,16 +618,15 @@ class Database:
                     GROUP BY category
                     ORDER BY total_amount DESC
                 """)
-                return [dict(row) for row in cursor.fetchall()]
+                return _fetch_columnar(cursor) if columnar else list(_rows_to_dicts(cursor))
         except sqlite3.Error as e:
             logger.error(f"Category summary failed: {e}")
-            return []
+            return {} if columnar else []
 
-    def get_vendor_summary(self):
-        """Get spending summary grouped by vendor"""
+    def get_vendor_summary(self, columnar=False):
+        """Get spending summary grouped by vendor; columnar=True returns {column: numpy array}"""
         try:
-            with sqlite3.connect(self.db_file) as conn:
-                conn.row_factory = sqlite3.Row
+            with self._read_connection() as conn:
                 cursor = conn.execute("""
                     SELECT 
                         vendor,
@@ -238,37 +639,35 @@ class Database:
                     GROUP BY vendor
                     ORDER BY total_amount DESC
                 """)
-                return [dict(row) for row in cursor.fetchall()]
+                return _fetch_columnar(cursor) if columnar else list(_rows_to_dicts(cursor))
         except sqlite3.Error as e:
             logger.error(f"Vendor summary failed: {e}")
-            return []
+            return {} if columnar else []
 
-    def get_monthly_spending(self, limit_months=12):
-        """Get spending summary by month"""
+    def get_monthly_spending(self, limit_months=12, columnar=False):
+        """Get spending summary by month; columnar=True returns {column: numpy array}"""
         try:
-            with sqlite3.connect(self.db_file) as conn:
-                conn.row_factory = sqlite3.Row
+            with self._read_connection() as conn:
                 cursor = conn.execute("""
                     SELECT 
-                        strftime('%Y-%m', date) as month,
+                        substr(date, 1, 7) as month,
                         COUNT(*) as receipt_count,
                         SUM(amount) as total_amount,
                         AVG(amount) as avg_amount
                     FROM receipts 
-                    GROUP BY strftime('%Y-%m', date)
+                    GROUP BY substr(date, 1, 7)
                     ORDER BY month DESC
                     LIMIT ?
                 """, (limit_months,))
-                return [dict(row) for row in cursor.fetchall()]
+                return _fetch_columnar(cursor) if columnar else list(_rows_to_dicts(cursor))
         except sqlite3.Error as e:
             logger.error(f"Monthly spending query failed: {e}")
-            return []
+            return {} if columnar else []
 
-    def get_daily_spending(self, days=30):
-        """Get spending summary by day for recent days"""
+    def get_daily_spending(self, days=30, columnar=False):
+        """Get spending summary by day for recent days; columnar=True returns {column: numpy array}"""
         try:
-            with sqlite3.connect(self.db_file) as conn:
-                conn.row_factory = sqlite3.Row
+            with self._read_connection() as conn:
                 cursor = conn.execute("""
                     SELECT 
                         date,
@@ -279,15 +678,30 @@ class Database:
                     GROUP BY date
                     ORDER BY date DESC
                 """, (days,))
-                return [dict(row) for row in cursor.fetchall()]
+                return _fetch_columnar(cursor) if columnar else list(_rows_to_dicts(cursor))
         except sqlite3.Error as e:
             logger.error(f"Daily spending query failed: {e}")
-            return []
+            return {} if columnar else []
+
+    def find_by_hash(self, file_hash):
+        """The stored receipt with this file hash as a dict, or None"""
+        if not self._hash_may_exist(file_hash):
+            return None
+        try:
+            with self._connection() as conn:
+                cursor = conn.execute("SELECT * FROM receipts WHERE file_hash = ?", (file_hash,))
+                return next(_rows_to_dicts(cursor), None)
+        except sqlite3.Error as e:
+            logger.error(f"Hash lookup failed: {e}")
+            return None
 
     def check_duplicate(self, file_hash):
         """Check if a receipt with the same hash already exists"""
+        # Hashes never seen can't be duplicates; only possible hits need SQL
+        if not self._hash_may_exist(file_hash):
+            return None
         try:
-            with sqlite3.connect(self.db_file) as conn:
+            with self._connection() as conn:
                 cursor = conn.execute("SELECT id, filename FROM receipts WHERE file_hash = ?", (file_hash,))
                 result = cursor.fetchone()
                 return result[1] if result else None
@@ -298,7 +712,7 @@ class Database:
     def delete_receipt(self, receipt_id):
         """Delete a receipt by ID"""
         try:
-            with sqlite3.connect(self.db_file) as conn:
+            with self._connection() as conn:
                 cursor = conn.execute("DELETE FROM receipts WHERE id = ?", (receipt_id,))
                 return cursor.rowcount > 0
         except sqlite3.Error as e:
@@ -311,24 +725,18 @@ class Database:
             if not updates:
                 return False
                 
-            # Build dynamic update query
-            valid_fields = ['filename', 'vendor', 'date', 'amount', 'category', 'text']
-            update_fields = []
-            params = []
-            
-            for field, value in updates.items():
-                if field in valid_fields:
-                    update_fields.append(f"{field} = ?")
-                    params.append(value)
+            # Walk the fields in a fixed order so every update touching the
+            # same set of fields reuses one cached statement string
+            update_fields = tuple(field for field in _UPDATABLE_FIELDS if field in updates)
+            params = [updates[field] for field in update_fields]
             
             if not update_fields:
                 return False
             
             params.append(receipt_id)
             
-            with sqlite3.connect(self.db_file) as conn:
-                query = f"UPDATE receipts SET {', '.join(update_fields)} WHERE id = ?"
-                cursor = conn.execute(query, params)
+            with self._connection() as conn:
+                cursor = conn.execute(_update_sql(update_fields), params)
                 return cursor.rowcount > 0
                 
         except sqlite3.Error as e:
@@ -338,16 +746,21 @@ class Database:
     def get_database_stats(self):
         """Get comprehensive database statistics"""
         try:
-            with sqlite3.connect(self.db_file) as conn:
+            with self._read_connection() as conn:
+                # Count and total come from receipt_totals; each distinct
+                # count is a GROUP BY walking its own index in order, and
+                # MIN/MAX(date) are single idx_date lookups
                 cursor = conn.execute("""
                     SELECT 
-                        COUNT(*) as total_records,
-                        COUNT(DISTINCT vendor) as unique_vendors,
-                        COUNT(DISTINCT category) as unique_categories,
-                        MIN(date) as oldest_receipt,
-                        MAX(date) as newest_receipt,
-                        SUM(amount) as total_value
-                    FROM receipts
+                        receipt_count as total_records,
+                        (SELECT COUNT(*) FROM (SELECT vendor FROM receipts
+                         WHERE vendor IS NOT NULL GROUP BY vendor)) as unique_vendors,
+                        (SELECT COUNT(*) FROM (SELECT category FROM receipts
+                         WHERE category IS NOT NULL GROUP BY category)) as unique_categories,
+                        (SELECT MIN(date) FROM receipts) as oldest_receipt,
+                        (SELECT MAX(date) FROM receipts) as newest_receipt,
+                        total_amount as total_value
+                    FROM receipt_totals WHERE id = 1
                 """)
                 row = cursor.fetchone()
                 if row:
@@ -366,7 +779,7 @@ class Database:
     def vacuum_database(self):
         """Optimize database by reclaiming unused space"""
         try:
-            with sqlite3.connect(self.db_file) as conn:
+            with self._connection() as conn:
                 conn.execute("VACUUM")
                 return True
         except sqlite3.Error as e:
@@ -376,9 +789,10 @@ class Database:
     def clear_all_data(self):
         """Delete all records from the receipts table."""
         try:
-            with sqlite3.connect(self.db_file) as conn:
+            with self._connection() as conn:
                 conn.execute("DELETE FROM receipts")
-                conn.commit()
+                if self._known_hashes is not None:
+                    self._known_hashes.clear()
             return True
         except sqlite3.Error as e:
             logger.error(f"Clear all data failed: {e}")
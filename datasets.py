@@ -5,6 +5,21 @@ Run this script to create all test files in your current directory
 """
 
 import os
+from concurrent.futures import ThreadPoolExecutor
+
+def _write_file(filename, content):
+    """Write one file as UTF-8 bytes; returns the exception on failure, else None"""
+    try:
+        fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+        try:
+            data = memoryview(content.encode('utf-8'))
+            while data:
+                data = data[os.write(fd, data):]
+        finally:
+            os.close(fd)
+    except Exception as e:
+        return e
+    return None
 
 def create_files():
     """Create all sample bill and receipt files"""
@@ -461,16 +476,19 @@ Category: Household
 '''
     }
     
-    # Create files
+    # Create files concurrently, then report on all of them at once
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        errors = list(executor.map(_write_file, files_data.keys(), files_data.values()))
+    
     created_files = []
-    for filename, content in files_data.items():
-        try:
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write(content)
+    report = []
+    for filename, error in zip(files_data, errors):
+        if error is None:
             created_files.append(filename)
-            print(f"✓ Created: {filename}")
-        except Exception as e:
-            print(f"✗ Error creating {filename}: {e}")
+            report.append(f"✓ Created: {filename}")
+        else:
+            report.append(f"✗ Error creating {filename}: {error}")
+    print("\n".join(report))
     
     print(f"\nSuccessfully created {len(created_files)} files!")
     print("\nFiles created:")
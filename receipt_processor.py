@@ -1,16 +1,22 @@
 # receipt_processor.py
 import os
 import re
+import sys
 import hashlib
+import heapq
 import logging
+import time
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 from pathlib import Path
-import pandas as pd
-import numpy as np
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass, is_dataclass
+from functools import lru_cache
+from importlib.util import find_spec
 import json
 import io
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from operator import itemgetter
 
 from database import Database
 from algorithms import Sorting, Searching, Aggregation
@@ -19,25 +25,65 @@ from algorithms import Sorting, Searching, Aggregation
 logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Try to import OCR stuff - if it's not installed, we'll handle it gracefully
+# orjson is a small C extension and much faster than json for result dicts
 try:
-    import pytesseract
-    from PIL import Image
-    HAS_OCR = True
+    import orjson
+    HAS_ORJSON = True
 except ImportError:
-    HAS_OCR = False
+    HAS_ORJSON = False
+
+# OCR and PDF libraries are heavy and only needed for image/PDF uploads, so
+# here we just check they're installed; they're imported on first use.
+# If they're missing, we'll handle it gracefully
+HAS_OCR = find_spec('pytesseract') is not None and find_spec('PIL') is not None
+if not HAS_OCR:
     print("OCR libraries not found - image text extraction won't work")
 
-try:
-    import PyPDF2
-    HAS_PDF = True
-except ImportError:
-    HAS_PDF = False
+# PyMuPDF extracts text far faster than the pure-Python readers; pypdf
+# (or the older PyPDF2) is only used when it isn't installed
+HAS_PYMUPDF = find_spec('pymupdf') is not None
+HAS_PDF = HAS_PYMUPDF or find_spec('pypdf') is not None or find_spec('PyPDF2') is not None
+if not HAS_PDF:
     print("PDF library not found - PDF processing won't work")
 
+@lru_cache(maxsize=1)
+def _get_tesseract():
+    """pytesseract and PIL.Image, imported on the first OCR"""
+    import pytesseract
+    from PIL import Image
+    return pytesseract, Image
+
+@lru_cache(maxsize=1)
+def _get_pdf_lib():
+    """pymupdf if installed, else pypdf's (or PyPDF2's) PdfReader; imported on the first PDF"""
+    if HAS_PYMUPDF:
+        import pymupdf
+        return pymupdf
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        from PyPDF2 import PdfReader
+    return PdfReader
+
 # Some basic limits to prevent issues
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB should be more than enough
-ALLOWED_TYPES = {'.jpg', '.jpeg', '.png', '.pdf', '.txt'}
+ALLOWED_TYPES = frozenset({'.jpg', '.jpeg', '.png', '.pdf', '.txt'})
+HASH_CHUNK_SIZE = 64 * 1024
+OCR_MAX_SIDE = 2000  # px; plenty for receipt text, and tesseract time grows with pixel count
+RECEIPTS_CACHE_TTL = 5  # seconds; bounds staleness from writes by other processes
+
+def _json_default(value):
+    """json fallback for what orjson handles natively: dataclasses and numpy values"""
+    if is_dataclass(value):
+        return asdict(value)
+    # A numpy value means numpy is already loaded, so never import it here
+    np = sys.modules.get('numpy')
+    if np is not None:
+        if isinstance(value, np.generic):
+            return value.item()
+        if isinstance(value, np.ndarray):
+            return value.tolist()
+    return str(value)
 
 class ReceiptProcessingError(Exception):
     """When something goes wrong with receipt processing"""
@@ -87,13 +133,31 @@ class FileHandler:
             'text': ['.txt']
         }
     
+    def _as_stream(self, file_data):
+        """
+        Files come in either as bytes or as a seekable binary file object
+        (e.g. a Streamlit upload). Returns a stream rewound to the start so
+        readers can pull from it without an extra bytes copy.
+        """
+        if isinstance(file_data, (bytes, bytearray, memoryview)):
+            return io.BytesIO(file_data)
+        file_data.seek(0)
+        return file_data
+    
+    def _file_size(self, file_data):
+        """Size in bytes without reading the file into memory"""
+        if isinstance(file_data, (bytes, bytearray, memoryview)):
+            return len(file_data)
+        return file_data.seek(0, io.SEEK_END)
+    
     def check_file(self, file_data, filename):
         """Basic file validation"""
-        if not file_data:
+        size = self._file_size(file_data) if file_data is not None else 0
+        if not size:
             raise ReceiptProcessingError("File is empty")
         
-        if len(file_data) > MAX_FILE_SIZE:
-            raise ReceiptProcessingError(f"File too big ({len(file_data)} bytes)")
+        if size > MAX_FILE_SIZE:
+            raise ReceiptProcessingError(f"File too big ({size} bytes)")
         
         ext = Path(filename).suffix.lower()
         if ext not in ALLOWED_TYPES:
@@ -130,7 +194,14 @@ class FileHandler:
             return "OCR not available - need to install pytesseract and PIL"
         
         try:
-            img = Image.open(io.BytesIO(file_data))
+            pytesseract, Image = _get_tesseract()
+            img = Image.open(self._as_stream(file_data))
+            # JPEGs can decode straight to a reduced grayscale image; tesseract
+            # converts to gray itself anyway, and PIL does it cheaper
+            img.draft('L', (OCR_MAX_SIDE, OCR_MAX_SIDE))
+            img = img.convert('L')
+            if max(img.size) > OCR_MAX_SIDE:
+                img.thumbnail((OCR_MAX_SIDE, OCR_MAX_SIDE), Image.LANCZOS)
             text = pytesseract.image_to_string(img)
             return text.strip() if text else "No text found in image"
         except Exception as e:
@@ -139,19 +210,40 @@ class FileHandler:
     def _extract_from_pdf(self, file_data):
         """Extract text from PDF files"""
         if not HAS_PDF:
-            return "PDF processing not available - need PyPDF2"
+            return "PDF processing not available - need PyMuPDF or pypdf"
         
         try:
-            pdf = PyPDF2.PdfReader(io.BytesIO(file_data))
-            text = ""
-            for page in pdf.pages:
-                text += page.extract_text() + "\n"
+            if HAS_PYMUPDF:
+                pymupdf = _get_pdf_lib()
+                # pymupdf reads bytes in place, so skip the stream wrapper.
+                # Hand it real bytes: before 1.25.5 it rejects a memoryview
+                # ("bad stream"), and a Streamlit upload is a BytesIO.
+                if isinstance(file_data, bytes):
+                    data = file_data
+                elif isinstance(file_data, (bytearray, memoryview)):
+                    data = bytes(file_data)
+                elif hasattr(file_data, 'getvalue'):
+                    data = file_data.getvalue()
+                else:
+                    data = self._as_stream(file_data).read()
+                # Plain text in content-stream order: no geometric sort, and no
+                # image/vector collection. Ligatures are expanded (not kept as
+                # single glyphs) so words like "fiscal" match the parser's patterns.
+                flags = pymupdf.TEXT_PRESERVE_WHITESPACE | pymupdf.TEXT_MEDIABOX_CLIP
+                with pymupdf.open(stream=data, filetype="pdf") as doc:
+                    text = "\n".join(page.get_text("text", flags=flags, sort=False) for page in doc)
+                return text.strip() if text.strip() else "No text in PDF"
+            
+            pdf = _get_pdf_lib()(self._as_stream(file_data))
+            text = "\n".join(page.extract_text() or "" for page in pdf.pages)
             return text.strip() if text.strip() else "No text in PDF"
         except Exception as e:
             return f"PDF extraction failed: {str(e)}"
 
     def _extract_from_text(self, file_data):
         """Handle text files with encoding issues"""
+        # Decoding needs the whole thing anyway, and text receipts are small
+        file_data = self._as_stream(file_data).read()
         # Try common encodings
         for encoding in ['utf-8', 'latin-1', 'cp1252']:
             try:
@@ -164,7 +256,18 @@ class FileHandler:
     
     def get_file_hash(self, file_data):
         """Generate hash for duplicate detection"""
-        return hashlib.sha256(file_data).hexdigest()
+        # In-memory data is hashed in one update call, no chunk copies
+        if isinstance(file_data, (bytes, bytearray, memoryview)):
+            return hashlib.sha256(file_data).hexdigest()
+        stream = self._as_stream(file_data)
+        # file_digest (3.11+) hashes a BytesIO's buffer directly and reads
+        # other files into one reused buffer
+        if hasattr(hashlib, 'file_digest'):
+            return hashlib.file_digest(stream, 'sha256').hexdigest()
+        digest = hashlib.sha256()
+        for chunk in iter(lambda: stream.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+        return digest.hexdigest()
 
 class ReceiptParser:
     """Parses receipt text to extract useful info"""
@@ -183,6 +286,55 @@ class ReceiptParser:
             'kroger': r'kroger',
             'home depot': r'home\s*depot',
         }
+        # Currency symbols and codes; '¥' is read as CNY on Chinese receipts
+        self.currency_patterns = {
+            'CAD': r'\bc\$|\bcad\b',
+            'AUD': r'\ba\$|\baud\b',
+            'USD': r'\$|\busd\b',
+            'EUR': r'€|\beur\b',
+            'GBP': r'£|\bgbp\b',
+            'JPY': r'¥|円|\bjpy\b',
+            'INR': r'₹|\brs\.|\binr\b',
+            'CNY': r'元|\bcny\b|\brmb\b',
+        }
+        
+        # Words that mark a non-English receipt; English is the default
+        self.language_markers = {
+            'de': r'\b(?:gesamt|summe|mwst|rechnung)\b',
+            'fr': r'\b(?:montant|merci|tva|facture)\b',
+            'es': r'\b(?:importe|gracias|iva|factura)\b',
+            'it': r'\b(?:totale|grazie|scontrino)\b',
+            'pt': r'\b(?:obrigado|nota fiscal)\b',
+            'ja': r'合計|領収書',
+            'zh': r'总计|合计|发票',
+            'hi': r'कुल|रसीद',
+        }
+        
+        # Vendor, currency and language patterns in one regex, so the text
+        # is scanned once for all three. Vendor names have spaces, so groups
+        # are named by kind and position.
+        self._vendor_names = list(self.vendor_patterns)
+        self._currency_codes = list(self.currency_patterns)
+        self._language_codes = list(self.language_markers)
+        self._scan_re = re.compile('|'.join(
+            f'(?P<{kind}{i}>{pattern})'
+            for kind, patterns in (('v', self.vendor_patterns), ('c', self.currency_patterns),
+                                   ('l', self.language_markers))
+            for i, pattern in enumerate(patterns.values())
+        ), re.IGNORECASE)
+        
+        # Common amount patterns I've seen. Amounts next to a total/amount/due
+        # keyword win; a bare $ figure is only used when none of these hit
+        self._amount_res = [re.compile(pattern, re.IGNORECASE) for pattern in (
+            r'total[:\s]*\$?(\d+\.?\d*)',
+            r'amount[:\s]*\$?(\d+\.?\d*)',
+            r'(\d+\.\d{2})\s*(?:total|due)',
+        )]
+        self._dollar_amount_re = re.compile(r'\$(\d+\.?\d*)')
+        self._date_res = [re.compile(pattern) for pattern in (
+            r'(\d{4}-\d{2}-\d{2})',  # 2023-12-25
+            r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',  # 12/25/2023 or 12-25-23
+        )]
         
         # Category mapping based on stores
         self.categories = {
@@ -205,7 +357,8 @@ class ReceiptParser:
         
         text_clean = text.lower().strip()
         
-        vendor = self._find_vendor(text_clean, filename)
+        vendor_index, currency, language = self._scan(text_clean)
+        vendor = self._find_vendor(text_clean, filename, vendor_index)
         amount = self._find_amount(text_clean)
         date = self._find_date(text_clean)
         category = self.categories.get(vendor.lower(), 'Other')
@@ -214,7 +367,9 @@ class ReceiptParser:
             'vendor': vendor,
             'amount': amount,
             'date': date,
-            'category': category
+            'category': category,
+            'currency': currency,
+            'language': language
         }
     
     def _get_defaults(self, filename):
@@ -223,53 +378,78 @@ class ReceiptParser:
             'vendor': filename.split('.')[0][:30],
             'amount': 0.0,
             'date': datetime.now().strftime('%Y-%m-%d'),
-            'category': 'Other'
+            'category': 'Other',
+            'currency': 'USD',
+            'language': 'en'
         }
     
-    def _find_vendor(self, text, filename):
-        """Try to identify the vendor from text"""
-        for vendor, pattern in self.vendor_patterns.items():
-            if re.search(pattern, text, re.IGNORECASE):
-                return vendor.title()
+    def _scan(self, text):
+        """
+        One pass of the combined regex over text. Returns the index of the
+        matched vendor (or None), the most frequent currency and the most
+        frequently marked language, defaulting to USD and English.
+        """
+        vendor_index = None
+        currencies = Counter()
+        languages = Counter()
+        for match in self._scan_re.finditer(text):
+            group = match.lastgroup
+            index = int(group[1:])
+            if group[0] == 'v':
+                # Earlier vendors in vendor_patterns win over earlier matches in the text
+                if vendor_index is None or index < vendor_index:
+                    vendor_index = index
+            elif group[0] == 'c':
+                currencies[self._currency_codes[index]] += 1
+            else:
+                languages[self._language_codes[index]] += 1
+        
+        language = languages.most_common(1)[0][0] if languages else 'en'
+        currency = currencies.most_common(1)[0][0] if currencies else 'USD'
+        if currency == 'JPY' and language == 'zh':
+            currency = 'CNY'
+        return vendor_index, currency, language
+    
+    def _find_vendor(self, text, filename, vendor_index=None):
+        """
+        Try to identify the vendor from text (already lowercased and stripped
+        by parse); vendor_index is the vendor pattern _scan matched, if any
+        """
+        if vendor_index is not None:
+            return self._vendor_names[vendor_index].title()
         
-        # If no pattern matches, use first line or filename
-        lines = text.strip().split('\n')
-        if lines and lines[0].strip():
-            return lines[0][:30].strip().title()
+        # If no pattern matches, use first line or filename. partition
+        # stops at the first newline instead of splitting the whole text.
+        first_line = text.partition('\n')[0]
+        if first_line.strip():
+            return first_line[:30].strip().title()
         
         return filename.split('.')[0][:30]
     
     def _find_amount(self, text):
         """Extract the total amount"""
-        # Common amount patterns I've seen
-        patterns = [
-            r'total[:\s]*\$?(\d+\.?\d*)',
-            r'amount[:\s]*\$?(\d+\.?\d*)',
-            r'\$(\d+\.?\d*)',
-            r'(\d+\.\d{2})\s*(?:total|due)',
-        ]
-        
-        amounts = []
+        best = self._max_amount(self._amount_res, text)
+        if best is None:
+            best = self._max_amount((self._dollar_amount_re,), text)
+        return best if best is not None else 0.0
+    
+    def _max_amount(self, patterns, text):
+        """Largest plausible amount captured by any of patterns, or None"""
+        best = None
         for pattern in patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            for match in matches:
+            for match in pattern.finditer(text):
                 try:
-                    amt = float(match)
-                    if 0 < amt < 10000:  # reasonable range
-                        amounts.append(amt)
+                    amt = float(match.group(1))
                 except ValueError:
                     continue
-        
-        return max(amounts) if amounts else 0.0
+                if 0 < amt < 10000 and (best is None or amt > best):  # reasonable range
+                    best = amt
+        return best
     
     def _find_date(self, text):
         """Extract the receipt date"""
-        patterns = [
-            r'(\d{4}-\d{2}-\d{2})',  # 2023-12-25
-            r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',  # 12/25/2023 or 12-25-23
-        ]
-        for pattern in patterns:
-            matches = re.findall(pattern, text)
+        for pattern in self._date_res:
+            matches = pattern.findall(text)
             for match in matches:
                 parsed_date = self._parse_date(match)
                 if parsed_date:
@@ -291,6 +471,11 @@ class ReceiptParser:
                 continue
         return None
 
+def _extract_and_parse(file_data, filename):
+    """Worker for process_receipts_batch: text and parsed fields of one file"""
+    text = FileHandler().extract_text(file_data, filename)
+    return text, ReceiptParser().parse(text, filename)
+
 class ReceiptProcessor:
     """Main class that ties everything together"""
     
@@ -302,10 +487,41 @@ class ReceiptProcessor:
         self.sorter = Sorting()
         self.searcher = Searching()
         self.aggregator = Aggregation()
+        # (fetched_at, write_count, limit, rows) of the last receipts fetch,
+        # shared by the search, dashboard and sorting methods
+        self._receipts_cache = None
+    
+    def _get_receipts(self, limit):
+        """
+        Newest `limit` receipts, reusing the last fetch while it is fresh,
+        nothing has been written through self.db since, and it covers the
+        request. The rows are shared, so callers must not modify them.
+        """
+        cached = self._receipts_cache
+        if (cached is not None and time.monotonic() - cached[0] < RECEIPTS_CACHE_TTL
+                and cached[1] == self.db.write_count):
+            _, _, cached_limit, rows = cached
+            if limit == cached_limit:
+                return rows
+            # A short fetch already holds every receipt
+            if limit < cached_limit or len(rows) < cached_limit:
+                return rows[:limit]
+        
+        write_count = self.db.write_count
+        rows = self.db.get_receipts(limit=limit)
+        if rows:
+            self._receipts_cache = (time.monotonic(), write_count, limit, rows)
+        return rows
     
     def process_receipt(self, file_data, filename):
-        """Process a receipt file from start to finish"""
+        """Process a receipt file (bytes or a binary file object) from start to finish"""
         try:
+            # Hash first: a file that's already stored skips OCR/PDF parsing
+            file_hash = self.file_handler.get_file_hash(file_data)
+            existing = self.db.find_by_hash(file_hash)
+            if existing is not None:
+                return self._duplicate_result(existing)
+            
             # Extract text from the file
             text = self.file_handler.extract_text(file_data, filename)
             
@@ -320,7 +536,9 @@ class ReceiptProcessor:
                 amount=parsed['amount'],
                 category=parsed['category'],
                 text=text,
-                file_hash=self.file_handler.get_file_hash(file_data)
+                currency=parsed['currency'],
+                language=parsed['language'],
+                file_hash=file_hash
             )
             
             # Save to database
@@ -329,17 +547,7 @@ class ReceiptProcessor:
             return {
                 'success': True,
                 'receipt_id': receipt_id,
-                'extracted_data': {
-                    'vendor': receipt.vendor,
-                    'amount': receipt.amount,
-                    'date': receipt.date,
-                    'category': receipt.category,
-                    'filename': receipt.filename,
-                    'upload_date': receipt.upload_date,
-                    # Add currency and language if present
-                    'currency': getattr(receipt, 'currency', None),
-                    'language': getattr(receipt, 'language', None)
-                }
+                'extracted_data': self._extracted_data(receipt)
             }
             
         except Exception as e:
@@ -349,16 +557,150 @@ class ReceiptProcessor:
                 'error': str(e)
             }
     
+    def _duplicate_result(self, existing):
+        """Result for a file whose hash is already stored, from the stored row"""
+        return {
+            'success': True,
+            'duplicate': True,
+            'receipt_id': existing['id'],
+            'extracted_data': {
+                **{field: existing.get(field) for field in
+                   ('vendor', 'amount', 'date', 'category', 'filename', 'upload_date')},
+                'currency': existing.get('currency', 'USD'),
+                'language': existing.get('language', 'en')
+            }
+        }
+    
+    def _extracted_data(self, receipt):
+        """The fields of a processed receipt reported back to the caller"""
+        return {
+            'vendor': receipt.vendor,
+            'amount': receipt.amount,
+            'date': receipt.date,
+            'category': receipt.category,
+            'filename': receipt.filename,
+            'upload_date': receipt.upload_date,
+            # Add currency and language if present
+            'currency': getattr(receipt, 'currency', None),
+            'language': getattr(receipt, 'language', None)
+        }
+    
+    def process_receipts_batch(self, files, max_workers=None):
+        """
+        Process many (file_data, filename) pairs at once. Extraction and
+        parsing run in a process pool, since OCR and PDF parsing are CPU
+        bound, and every receipt is then saved in one transaction. As in
+        process_receipt, files whose hash is already stored (or that repeat
+        an earlier file in the batch) skip extraction and come back marked
+        'duplicate'. Returns one result per file, in order, shaped like
+        process_receipt's but without receipt_id for new receipts (the bulk
+        insert doesn't report row ids).
+        """
+        if not files:
+            return []
+        # File objects don't pickle, so workers get the bytes
+        jobs = [(data if isinstance(data, (bytes, bytearray, memoryview))
+                 else self.file_handler._as_stream(data).read(), filename)
+                for data, filename in files]
+        
+        # Hash first, like process_receipt, and only send new files to the pool
+        hashes = [self.file_handler.get_file_hash(data) for data, _ in jobs]
+        first_index = {}
+        stored = {}
+        new_jobs = []
+        for i, file_hash in enumerate(hashes):
+            if file_hash in first_index:
+                continue
+            first_index[file_hash] = i
+            existing = self.db.find_by_hash(file_hash)
+            if existing is not None:
+                stored[file_hash] = existing
+            else:
+                new_jobs.append(i)
+        
+        if len(new_jobs) == 1:
+            outcomes = [self._run_batch_job(*jobs[new_jobs[0]])]
+        elif new_jobs:
+            workers = min(len(new_jobs), max_workers or os.cpu_count() or 1)
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(_extract_and_parse, *jobs[i]) for i in new_jobs]
+                outcomes = [self._collect_batch_job(future) for future in futures]
+        else:
+            outcomes = []
+        
+        results = [None] * len(jobs)
+        receipts = []
+        for i, outcome in zip(new_jobs, outcomes):
+            filename = jobs[i][1]
+            try:
+                if isinstance(outcome, Exception):
+                    raise outcome
+                text, parsed = outcome
+                file_hash = hashes[i]
+                receipt = Receipt(
+                    filename=filename,
+                    vendor=parsed['vendor'],
+                    date=parsed['date'],
+                    amount=parsed['amount'],
+                    category=parsed['category'],
+                    text=text,
+                    currency=parsed['currency'],
+                    language=parsed['language'],
+                    file_hash=file_hash
+                )
+                receipts.append(receipt)
+                results[i] = {'success': True, 'extracted_data': self._extracted_data(receipt)}
+            except Exception as e:
+                logger.error(f"Processing failed for {filename}: {e}")
+                results[i] = {'success': False, 'error': str(e)}
+        
+        if receipts and self.db.save_receipts(receipts) != len(receipts):
+            for i in new_jobs:
+                if results[i]['success']:
+                    results[i].update(success=False, error='Could not save receipts')
+        
+        for i, file_hash in enumerate(hashes):
+            if file_hash in stored:
+                results[i] = self._duplicate_result(stored[file_hash])
+            elif first_index[file_hash] != i:
+                # A repeat within the batch reports its first copy's outcome
+                first = results[first_index[file_hash]]
+                results[i] = {**first, 'duplicate': True} if first['success'] else dict(first)
+        return results
+    
+    def _run_batch_job(self, data, filename):
+        """Inline version of the pool job; errors are returned, not raised"""
+        try:
+            return _extract_and_parse(data, filename)
+        except Exception as e:
+            return e
+    
+    def _collect_batch_job(self, future):
+        """Result of a pool job, or the exception it raised"""
+        try:
+            return future.result()
+        except Exception as e:
+            return e
+    
     def search_receipts(self, query, limit=50):
         """Search receipts using keyword search algorithm"""
         try:
-            all_receipts = self.db.get_receipts(limit=1000)  # Get more for comprehensive search
+            if not query:
+                return self._get_receipts(limit=limit)
+            
+            # The database's full-text index narrows things down to receipts
+            # containing any of the terms; the keyword search then scores
+            # just those instead of scanning every receipt's text in Python
+            candidates = self.db.search_any_terms(query.lower().split(), limit=1000)
             
             # Define which fields to search in
             search_fields = ['vendor', 'category', 'text', 'filename']
             
-            # Use the keyword search algorithm
-            results = self.searcher.keyword_search(all_receipts, query, search_fields)
+            # Use the keyword search algorithm. Its result cache is keyed on
+            # our write counter plus a time bucket, like _get_receipts, so
+            # writes from other processes show up within the ttl too.
+            version = (self.db.write_count, int(time.monotonic() // RECEIPTS_CACHE_TTL))
+            results = self.searcher.keyword_search(candidates, query, search_fields, version=version)
             
             return results[:limit]  # Return top results
         except Exception as e:
@@ -366,50 +708,37 @@ class ReceiptProcessor:
             return []
     
     def get_spending_analytics(self):
-        """Get advanced spending analytics using aggregation algorithms"""
+        """Get spending analytics; SQLite does the aggregation, not Python"""
         try:
-            all_receipts = self.db.get_receipts(limit=1000)
-            
-            if not all_receipts:
+            summary = self.db.get_spending_summary()
+            if not summary.get('total_receipts'):
                 return {'error': 'No receipts found'}
             
-            # Basic statistics using aggregation methods
-            amounts = [receipt['amount'] for receipt in all_receipts if receipt['amount']]
-            median_spending = self.aggregator.calculate_median(amounts)
-            
-            categories = [receipt['category'] for receipt in all_receipts]
-            most_common_category = self.aggregator.calculate_mode(categories)
-            
-            # Group and aggregate by category
-            category_aggregations = self.aggregator.group_and_aggregate(
-                all_receipts, 
-                'category', 
-                {'amount': ['sum', 'avg', 'count']}
-            )
-            
-            # Group and aggregate by vendor
-            vendor_aggregations = self.aggregator.group_and_aggregate(
-                all_receipts,
-                'vendor',
-                {'amount': ['sum', 'avg', 'count']}
-            )
+            category_rows = self._keyed_rows(self.db.get_category_summary(), 'category')
+            vendor_rows = self._keyed_rows(self.db.get_vendor_summary(), 'vendor')
+            # A negative LIMIT is no limit in SQLite, so this is every month
+            monthly = self.db.get_monthly_spending(limit_months=-1, columnar=True)
             
-            # Time series aggregation by month
+            # Lay the per-month totals on a continuous range, empty months as 0
             monthly_spending = self.aggregator.time_series_aggregation(
-                all_receipts, 
-                'date', 
-                'amount', 
+                monthly, 
+                'month', 
+                'total_amount', 
                 'M'
             )
             
+            most_common_category = (max(category_rows, key=itemgetter('receipt_count'))['category']
+                                    if category_rows else None)
+            
             return {
-                'total_receipts': len(all_receipts),
-                'total_spending': sum(amounts),
-                'average_spending': sum(amounts) / len(amounts) if amounts else 0,
-                'median_spending': median_spending,
+                'total_receipts': summary['total_receipts'],
+                'total_spending': summary['total_spent'],
+                # Receipts the parser found no amount on (0.0) don't count
+                'average_spending': summary['avg_paid_amount'],
+                'median_spending': summary['median_paid_spend'],
                 'most_common_category': most_common_category,
-                'category_breakdown': category_aggregations,
-                'vendor_breakdown': vendor_aggregations,
+                'category_breakdown': self._amount_breakdown(category_rows, 'category'),
+                'vendor_breakdown': self._amount_breakdown(vendor_rows, 'vendor'),
                 'monthly_spending': monthly_spending
             }
             
@@ -417,22 +746,37 @@ class ReceiptProcessor:
             logger.error(f"Analytics failed: {e}")
             return {'error': 'Could not generate analytics'}
     
+    def _keyed_rows(self, summary_rows, group_by_key):
+        """
+        Drops the NULL group SQL's GROUP BY keeps, as group_and_aggregate
+        skipped rows without a key
+        """
+        return [row for row in summary_rows if row[group_by_key] is not None]
+    
+    def _amount_breakdown(self, summary_rows, group_by_key):
+        """Per-group rows from a Database summary query, keyed like group_and_aggregate"""
+        return {
+            row[group_by_key]: {
+                'amount_sum': row['total_amount'],
+                'amount_avg': row['avg_amount'],
+                'amount_count': row['receipt_count']
+            }
+            for row in summary_rows
+        }
+    
     def get_dashboard_data(self):
         """Get data for dashboard display"""
         try:
             summary = self.db.get_spending_summary()
-            recent_receipts = self.db.get_receipts(10)
-            all_receipts = self.db.get_receipts(limit=500) # Get more for sorting
+            all_receipts = self._get_receipts(limit=500) # Get more for sorting
+            recent_receipts = self._get_receipts(limit=10)  # served from the fetch above
             # Aggregate vendor totals from all receipts
-            vendor_totals = {}
+            vendor_totals = defaultdict(int)
             for receipt in all_receipts:
-                vendor = receipt['vendor']
-                amount = receipt['amount']
-                vendor_totals[vendor] = vendor_totals.get(vendor, 0) + amount
-            # Prepare for sorting
-            vendor_list = [{'vendor': v, 'total_spent': a} for v, a in vendor_totals.items()]
-            # Use custom quicksort to get top vendors
-            top_vendors = self.sorter.quicksort(vendor_list, 'total_spent', ascending=False)[:5]
+                vendor_totals[receipt['vendor']] += receipt['amount']
+            # Only the top 5 are needed, so a bounded heap instead of a full sort
+            top_vendors = [{'vendor': v, 'total_spent': a}
+                           for v, a in heapq.nlargest(5, vendor_totals.items(), key=itemgetter(1))]
             return {
                 'summary': summary,
                 'recent_receipts': recent_receipts,
@@ -443,13 +787,12 @@ class ReceiptProcessor:
             return {'error': 'Could not load dashboard data'}
     
     def get_sorted_receipts(self, sort_by='date', ascending=True, limit=100):
-        """Get receipts sorted by specified field using custom sort algorithm"""
+        """Get receipts sorted by specified field"""
         try:
-            receipts = self.db.get_receipts(limit=limit)
+            receipts = self._get_receipts(limit=limit)
             if not receipts:
                 return []
-            # Use the quicksort algorithm from algorithms.py
-            sorted_receipts = self.sorter.quicksort(receipts, sort_by, ascending)
+            sorted_receipts = sorted(receipts, key=itemgetter(sort_by), reverse=not ascending)
             return sorted_receipts
         except Exception as e:
             logger.error(f"Sorting failed: {e}")
@@ -458,26 +801,17 @@ class ReceiptProcessor:
     def get_category_insights(self):
         """Get insights about spending categories using aggregation"""
         try:
-            all_receipts = self.db.get_receipts(limit=1000)
-            if not all_receipts:
+            # Grouped by SQLite and already ordered by total spending
+            category_rows = self.db.get_category_summary()
+            if not category_rows:
                 return {'error': 'No receipts found'}
-            # Group by category and get comprehensive stats
-            category_stats = self.aggregator.group_and_aggregate(
-                all_receipts,
-                'category',
-                {'amount': ['sum', 'avg', 'count'], 'id': ['count']}
-            )
-            # Sort categories by total spending
-            category_list = []
-            for category, stats in category_stats.items():
-                category_list.append({
-                    'category': category,
-                    'total_spent': stats.get('amount_sum', 0),
-                    'average_amount': stats.get('amount_avg', 0),
-                    'transaction_count': stats.get('amount_count', 0)
-                })
-            # Use quicksort to sort by total spending
-            sorted_categories = self.sorter.quicksort(category_list, 'total_spent', ascending=False)
+            category_rows = self._keyed_rows(category_rows, 'category')
+            sorted_categories = [{
+                'category': row['category'],
+                'total_spent': row['total_amount'],
+                'average_amount': row['avg_amount'],
+                'transaction_count': row['receipt_count']
+            } for row in category_rows]
             return {
                 'category_insights': sorted_categories,
                 'total_categories': len(sorted_categories)
@@ -489,26 +823,17 @@ class ReceiptProcessor:
     def get_vendor_insights(self):
         """Get insights about vendors using aggregation and sorting"""
         try:
-            all_receipts = self.db.get_receipts(limit=1000)
-            if not all_receipts:
+            # Grouped by SQLite and already ordered by total spending
+            vendor_rows = self.db.get_vendor_summary()
+            if not vendor_rows:
                 return {'error': 'No receipts found'}
-            # Group by vendor and get comprehensive stats
-            vendor_stats = self.aggregator.group_and_aggregate(
-                all_receipts,
-                'vendor',
-                {'amount': ['sum', 'avg', 'count']}
-            )
-            # Convert to list for sorting
-            vendor_list = []
-            for vendor, stats in vendor_stats.items():
-                vendor_list.append({
-                    'vendor': vendor,
-                    'total_spent': stats.get('amount_sum', 0),
-                    'average_amount': stats.get('amount_avg', 0),
-                    'visit_count': stats.get('amount_count', 0)
-                })
-            # Sort by total spending using quicksort
-            sorted_vendors = self.sorter.quicksort(vendor_list, 'total_spent', ascending=False)
+            vendor_rows = self._keyed_rows(vendor_rows, 'vendor')
+            sorted_vendors = [{
+                'vendor': row['vendor'],
+                'total_spent': row['total_amount'],
+                'average_amount': row['avg_amount'],
+                'visit_count': row['receipt_count']
+            } for row in vendor_rows]
             return {
                 'vendor_insights': sorted_vendors,
                 'total_vendors': len(sorted_vendors)
@@ -528,3 +853,11 @@ class ReceiptProcessor:
             'Processing Speed': '1.2s/receipt',
             'Confidence Score': '96.8%'
         }
+
+    def to_json(self, obj, indent=False):
+        """UTF-8 JSON bytes for a result from this class (or a Receipt), via orjson when available"""
+        if HAS_ORJSON:
+            # json turns non-str keys (e.g. a NULL category) into strings; match it
+            option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+            return orjson.dumps(obj, option=option, default=str)
+        return json.dumps(obj, indent=2 if indent else None, default=_json_default).encode('utf-8')
@@ -0,0 +1,53 @@
+# test_algorithms.py
+import pytest
+
+from algorithms import Aggregation, GROUPBY_VECTORIZE_THRESHOLD, _load_duckdb
+
+# Every kind of value group_and_aggregate has to cope with: ints, floats,
+# bools, numeric strings, None, a missing field and a missing group key
+MIXED_ROWS = [
+    {'category': 'Food', 'amount': 12.5},
+    {'category': 'Food', 'amount': 3},
+    {'category': 'Food', 'amount': '7.25'},
+    {'category': 'Food', 'amount': None},
+    {'category': 'Travel', 'amount': True},
+    {'category': 'Travel', 'amount': 'n/a'},
+    {'category': 'Travel'},
+    {'category': 'Other', 'amount': None},
+    {'category': None, 'amount': 100.0},
+    {'amount': 50},
+]
+AGGREGATIONS = {'amount': ['sum', 'avg', 'count']}
+
+
+@pytest.fixture
+def streaming_result():
+    # Well under the threshold, so this takes the pure-Python path
+    assert len(MIXED_ROWS) <= GROUPBY_VECTORIZE_THRESHOLD
+    return Aggregation().group_and_aggregate(MIXED_ROWS, 'category', AGGREGATIONS)
+
+
+def _assert_same_groups(expected, actual):
+    assert list(actual) == list(expected)
+    for key, aggregates in expected.items():
+        assert actual[key] == pytest.approx(aggregates)
+
+
+def test_streaming_takes_only_numbers(streaming_result):
+    assert streaming_result == {
+        'Food': {'amount_sum': 15.5, 'amount_avg': 7.75, 'amount_count': 4},
+        'Travel': {'amount_sum': 1, 'amount_avg': 1.0, 'amount_count': 2},
+        'Other': {'amount_sum': 0, 'amount_avg': 0, 'amount_count': 1},
+    }
+
+
+def test_vectorized_matches_streaming(streaming_result):
+    actual = Aggregation()._group_and_aggregate_vectorized(MIXED_ROWS, 'category', AGGREGATIONS)
+    _assert_same_groups(streaming_result, actual)
+
+
+def test_duckdb_matches_streaming(streaming_result):
+    if _load_duckdb() is None:
+        pytest.skip("duckdb is not installed")
+    actual = Aggregation()._group_and_aggregate_duckdb(MIXED_ROWS, 'category', AGGREGATIONS)
+    _assert_same_groups(streaming_result, actual)